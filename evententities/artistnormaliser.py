@@ -2,10 +2,93 @@ import re
 from itertools import chain
 from collections import OrderedDict
 
+def _spelled_numbers():
+	"""
+	return an ordered dictionary mapping spelled out numbers between 1 and 99 to numbers
+	"""
+	numbers_1to9 = 'one two three four five six seven eight nine'.split() 
+	mappings_1to9 = {t[0]: str(t[1]) 
+						   for t in zip(numbers_1to9, range(1,10))}
+	
+	mappings_10to19 = {t[0]: str(t[1]) 
+						   for t in zip("""ten eleven twelve thirteen fourteen fifteen 
+										  sixteen seventeen eighteen nineteen""".split(), range(10,20))}
+	
+	numbers_20to90 = 'twenty thirty forty fifty sixty seventy eighty ninety'.split()
+	mappings_20to90 = {t[0]: str(t[1]) 
+						   for t in zip(numbers_20to90, range(20,100,10))}
+	
+	# produce numbers like twenty one, fifty seven, etc.
+	numbers_21to99 = [' '.join([s,p]) for s in numbers_20to90 for p in numbers_1to9]
+	
+	"""
+	create an ordered dictionary mapping spelled numbers to numbers in
+	digits; note that the order is important because we want to search
+	for spelled numbers starting from the compound ones like twenty two,
+	then try to find the rest
+	"""
+	
+	od = OrderedDict({t[0]:t[1] 
+						for t in zip(numbers_21to99, 
+									 # create a list [21,22,..,29,31,..,39,41,..,99]
+									 [_ for _ in chain.from_iterable([[str(_) for _ in range(int(d)*10 + 1,int(d+1)*10)] 
+										   for d in range(2,10)])])})
+	od.update(mappings_20to90)
+	od.update(mappings_10to19)
+	od.update(mappings_1to9)
+
+	return od
+
+
 class BaseNormaliser:
 	"""
 	this class has methods useful no matter what you normalize
 	"""
+	ABBREVIATIONS = {'gws': 'greater western sydney giants',
+					 'gwsg': 'greater western sydney giants',
+					 'afl': 'australian football league',
+					 'nrc': 'national rugby championship',
+					 'nrl': 'national rugby league',
+					 'syd': 'sydney',
+					 'mel': 'melbourne',
+					 'melb': 'melbourne',
+					 'bris': 'brisbane',
+					 'brisb': 'brisbane',
+					 'gc': 'gold coast',
+					 'adel': 'adelaide',
+					 'canb': 'canberra',
+					 'mt': 'mount',
+					 'utd': 'united',
+					 'cty': 'city',
+					 'football club': 'fc',
+					 'snr': 'senior',
+					 'jr': 'junion',
+					 'nsw': 'new south wales' ,
+					 'vic': 'victoria',
+					 'tas' : 'tasmania',
+					 'sa': 'south australia',
+					 'wa': 'western australia',
+					 'act': 'australian capital territory',
+					 'nt': 'northern territory',
+					 'qld': 'queensland',
+					 'champs': 'championships', 
+					 'champ': 'championship', 
+					 'soc': 'society',
+					 'ent': 'entertainment',
+					 'intl': 'international', 
+					 'int': 'international', 
+					 'aust': 'australian'}
+
+	# states and territories; deabbreviate expands these to full names
+	AUS_STATES = ('nsw', 'vic', 'tas', 'sa', 'wa', 'act', 'nt', 'qld')
+
+	SPELLED_NUMBERS = _spelled_numbers()
+
+	# one regex per substitution table instead of one re.sub per table entry; the alternatives are
+	# tried in table order so compound numbers like twenty two still win over twenty and two
+	_ABBR_RE = re.compile(r'\b(?:' + '|'.join(ABBREVIATIONS) + r')\b')
+	_NUMBERS_RE = re.compile(r'\b(?:' + '|'.join(SPELLED_NUMBERS) + r')\b')
+
 	def __init__(self):
 		pass
 
@@ -25,86 +108,26 @@ class BaseNormaliser:
 		returns string s where all spelled out numbers between 0 and 99 are
 		converted to numbers
 		"""
-		numbers_1to9 = 'one two three four five six seven eight nine'.split() 
-		mappings_1to9 = {t[0]: str(t[1]) 
-							   for t in zip(numbers_1to9, range(1,10))}
-		
-		mappings_10to19 = {t[0]: str(t[1]) 
-							   for t in zip("""ten eleven twelve thirteen fourteen fifteen 
-											  sixteen seventeen eighteen nineteen""".split(), range(10,20))}
-		
-		numbers_20to90 = 'twenty thirty forty fifty sixty seventy eighty ninety'.split()
-		mappings_20to90 = {t[0]: str(t[1]) 
-							   for t in zip(numbers_20to90, range(20,100,10))}
-		
-		# produce numbers like twenty one, fifty seven, etc.
-		numbers_21to99 = [' '.join([s,p]) for s in numbers_20to90 for p in numbers_1to9]
-		
-		"""
-		create an ordered dictionary mapping spelled numbers to numbers in
-		digits; note that the order is important because we want to search
-		for spelled numbers starting from the compound ones like twenty two,
-		then try to find the rest
-		"""
-		
-		od = OrderedDict({t[0]:t[1] 
-							for t in zip(numbers_21to99, 
-										 # create a list [21,22,..,29,31,..,39,41,..,99]
-										 [_ for _ in chain.from_iterable([[str(_) for _ in range(int(d)*10 + 1,int(d+1)*10)] 
-											   for d in range(2,10)])])})
-		od.update(mappings_20to90)
-		od.update(mappings_10to19)
-		od.update(mappings_1to9)
-		
-		for w_ in od:
-			  s = re.sub(r'\b' + w_ + r'\b', od[w_], s)
-		
-		return s
+		return self._NUMBERS_RE.sub(lambda m: self.SPELLED_NUMBERS[m.group(0)], s)
 
 	def deabbreviate(self, st):
 		"""
 		unfold abbreviations in string st
 		"""
-		abbrs = {'gws': 'greater western sydney giants',
-				 'gwsg': 'greater western sydney giants',
-				 'afl': 'australian football league',
-				 'nrc': 'national rugby championship',
-				 'nrl': 'national rugby league',
-				 'syd': 'sydney',
-				 'mel': 'melbourne',
-				 'melb': 'melbourne',
-				 'bris': 'brisbane',
-				 'brisb': 'brisbane',
-				 'gc': 'gold coast',
-				 'adel': 'adelaide',
-				 'canb': 'canberra',
-				 'mt': 'mount',
-				 'utd': 'united',
-				 'cty': 'city',
-				 'football club': 'fc',
-				 'snr': 'senior',
-				 'jr': 'junion',
-				 'nsw': 'new south wales' ,
-				 'vic': 'victoria',
-				 'tas' : 'tasmania',
-				 'sa': 'south australia',
-				 'wa': 'western australia',
-				 'act': 'australian capital territory',
-				 'nt': 'northern territory',
-				 'qld': 'queensland',
-				 'champs': 'championships', 
-				 'champ': 'championship', 
-				 'soc': 'society',
-				 'ent': 'entertainment',
-				 'intl': 'international', 
-				 'int': 'international', 
-				 'aust': 'australian'}
-
-		# first replace full state names by abbreviations;
-		for ab in abbrs:
-			st = re.sub(r'\b' + ab + r'\b', abbrs[ab], st)
-
-		return st
+		return self._ABBR_RE.sub(lambda m: self.ABBREVIATIONS[m.group(0)], st)
+
+	def normalize_series(self, ser):
+		"""
+		same as normalize but for a whole pandas Series of strings at once
+		"""
+		ser = ser.str.lower() \
+				.str.replace(self._ABBR_RE, lambda m: self.ABBREVIATIONS[m.group(0)], regex=True) \
+				.str.replace(r'[_\-:;/.,\"\`\']', ' ', regex=True) \
+				.str.replace(r'[\[\]\{\}\(\)]', '', regex=True) \
+				.str.replace(self._NUMBERS_RE, lambda m: self.SPELLED_NUMBERS[m.group(0)], regex=True) \
+				.str.replace(' and ', ' & ', regex=False)
+
+		return ser.str.replace(r'\s{2,}', ' ', regex=True).str.strip()
 
 
 class ArtistNameNormaliser(BaseNormaliser):
@@ -137,6 +160,22 @@ class ArtistNameNormaliser(BaseNormaliser):
 		
 		return name
 
+	def normalize_series(self, names):
+		"""
+		same as normalize but for a whole pandas Series of names at once
+		"""
+		names = super().normalize_series(names.str.replace(r'\s*:[\(\)]\s*', ' @artist ', regex=True))
+
+		maybe_artist = names.str.strip().isin(['?', '...'])
+
+		names = names.str.replace(r'\!+(?=[^\b\w])', '', regex=True) \
+					.str.replace(r'\!+$', '', regex=True) \
+					.str.replace('!', 'i', regex=False) \
+					.str.replace(r'^(the|a)\s+', '', regex=True) \
+					.str.replace(r'\s{2,}', ' ', regex=True).str.strip()
+
+		return names.mask(maybe_artist, '@artist')
+
 if __name__ == '__main__':
 
 	an = ArtistNameNormaliser()
@@ -0,0 +1,139 @@
+"""
+measure the database side of the feature factory on a local stand-in for the event table: how fast new event keys
+are found with either kind of tracking (a file with processed keys or committed backfill ranges), how fast the new
+events are fetched with every get_events strategy and how fast they're saved and read back in every snapshot format;
+reports rows/sec and peak memory for every step and share of new keys
+
+usage (from the evententities directory so that ./data can be found):
+
+	python benchmarks/eventio.py [--db event_dim.db] [--rows 2000000] [--url sqlite:///event_dim.db] [--table event_dim]
+									[--new-keys 0.001,0.01,0.1,0.5] [--strategies in,scan,chunked] [--tracking file,backfill]
+
+without --url the SQLite database --db is used and, if it's not there, made with --rows rows first (see
+utils/make_event_dim.py). Every step runs twice: once to time it and once under tracemalloc for peak memory
+as tracing slows things down
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from eventities import EventFeatureFactory
+from utils.make_event_dim import make_event_dim
+
+
+def measure(fn):
+	"""
+	call fn twice; return what it returned, seconds it took the first time and peak traced memory in MB the second time
+	"""
+	t_ = time.perf_counter()
+	out_ = fn()
+	dt_ = time.perf_counter() - t_
+
+	tracemalloc.start()
+	fn()
+	_, peak_ = tracemalloc.get_traced_memory()
+	tracemalloc.stop()
+
+	return out_, dt_, peak_/2**20
+
+def track(eff, old_pks, tracking, chunk_size=50000):
+	"""
+	make it look like events old_pks have been processed, either by writing them to the file with processed
+	keys or by committing them as backfill ranges
+	"""
+	for d in [eff.OLDEVENT_DIR, eff.BACKFILL_DIR]:
+		shutil.rmtree(d, ignore_errors=True)
+
+	eff._ensure_dirs()
+
+	if tracking == 'file':
+		eff._track(old_pks)
+		return
+
+	os.mkdir(eff.BACKFILL_DIR)
+
+	for i in range(0, len(old_pks), chunk_size):
+		json.dump({'pks': [str(k) for k in old_pks[i:i + chunk_size]]},
+					open(os.path.join(eff.BACKFILL_DIR, f'range_{i:012d}_{i + chunk_size:012d}.json'), 'w'))
+
+
+if __name__ == '__main__':
+
+	parser = argparse.ArgumentParser(description='event table fetch and tracking benchmark')
+	parser.add_argument('--db', default='event_dim.db', help='SQLite database to use if no --url is given')
+	parser.add_argument('--rows', type=int, default=2000000, help='rows to generate if --db doesn\'t exist')
+	parser.add_argument('--url', help='sqlalchemy url of the database with the event table')
+	parser.add_argument('--table', default='event_dim')
+	parser.add_argument('--new-keys', default='0.001,0.01,0.1,0.5', help='shares of the table to treat as new events')
+	parser.add_argument('--strategies', default='in,scan,chunked', help='get_events strategies')
+	parser.add_argument('--tracking', default='file,backfill', help='how processed keys are tracked')
+
+	args = parser.parse_args()
+
+	if not args.url:
+		if not os.path.exists(args.db):
+			print(f'making {args.rows:,} rows in {args.db}...')
+			make_event_dim(args.db, args.rows)
+		args.url = f'sqlite:///{os.path.abspath(args.db)}'
+
+	eff = EventFeatureFactory().start_session(url=args.url)
+	eff.EVENT_TBL = args.table
+
+	try:
+		import pyarrow
+		formats = list(eff.SNAPSHOT_FORMATS)
+	except ImportError:
+		formats = ['csv']
+
+	# the factory writes to directories relative to where we are; dictionaries have been loaded by now
+	work_dir = tempfile.mkdtemp(prefix='eventio_')
+	os.chdir(work_dir)
+
+	all_pks, dt_, mb_ = measure(lambda: sorted(eff.get_column(eff.EVENT_TBL, 'pk_event_dim', 'bigint', True)))
+
+	results = [('-', 'get_column', '-', len(all_pks), dt_, mb_)]
+
+	for share in [float(_) for _ in args.new_keys.split(',')]:
+
+		# the newest events are the new ones
+		old_pks = all_pks[:len(all_pks) - int(share*len(all_pks))]
+
+		for tracking in args.tracking.split(','):
+
+			track(eff, old_pks, tracking)
+
+			_, dt_, mb_ = measure(eff.find_new_events)
+			results.append((share, 'find_new_events', tracking, len(eff.NEW_EVENT_PKS), dt_, mb_))
+
+		for strategy in args.strategies.split(','):
+
+			_, dt_, mb_ = measure(lambda: eff.get_events(strategy))
+			results.append((share, 'get_events', strategy, len(eff.events_), dt_, mb_))
+
+		for fmt in formats:
+
+			_, dt_, mb_ = measure(lambda: eff.save(f'events{eff.SNAPSHOT_FORMATS[fmt]}'))
+			results.append((share, 'save', fmt, len(eff.events_), dt_, mb_))
+
+			_, dt_, mb_ = measure(lambda: eff.from_snapshots([f'events{eff.SNAPSHOT_FORMATS[fmt]}']))
+			results.append((share, 'from_snapshots', fmt, len(eff.events_), dt_, mb_))
+
+		pks_ = eff.events_['pk_event_dim'].tolist()
+
+		_, dt_, mb_ = measure(lambda: eff._track(pks_))
+		results.append((share, 'track', 'file', len(pks_), dt_, mb_))
+
+	eff.close_session()
+	shutil.rmtree(work_dir, ignore_errors=True)
+
+	print(f'\n{"new keys":>8} {"step":>16} {"strategy":>9} {"rows":>10} {"sec":>8} {"rows/sec":>12} {"peak, MB":>9}')
+	for share, step, strategy, n, dt_, mb_ in results:
+		print(f'{share!s:>8} {step:>16} {strategy:>9} {n:>10,} {dt_:>8.2f} {n/dt_ if dt_ else 0:>12,.0f} {mb_:>9.1f}')
@@ -0,0 +1,79 @@
+"""
+measure how long it takes to import the labelling modules with python -X importtime and check that
+heavy dependencies stay out of the import; exits with 1 if a module is over budget or pulls them in
+
+usage (from the evententities directory):
+
+	python benchmarks/importtime.py [--module labeller --module eventities] [--budget-ms 100] [--repeat 5] [--show 10]
+
+every import runs in a fresh interpreter; the best of --repeat runs is compared with the budget
+"""
+
+import os
+import sys
+import argparse
+import subprocess
+
+# none of these should be imported just because the labelling code is
+HEAVY = ('pandas', 'numpy', 'sqlalchemy', 'arrow', 'enchant', 'jellyfish', 'pyarrow')
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+
+
+def measure(module):
+	"""
+	import module in a fresh interpreter; return the cumulative import time in microseconds,
+	(self time, cumulative time, name) for every module it imported and the heavy modules that got imported
+	"""
+	res_ = subprocess.run([sys.executable, '-X', 'importtime', '-c',
+							f'import sys, {module}; print(",".join(m for m in {HEAVY!r} if m in sys.modules))'],
+							cwd=ROOT, capture_output=True, text=True)
+
+	if res_.returncode:
+		raise RuntimeError(f'failed to import {module}:\n{res_.stderr}')
+
+	rows_ = []
+
+	for l in res_.stderr.splitlines():
+		# import time: self [us] | cumulative | imported package
+		if l.startswith('import time:') and ('|' in l) and ('[us]' not in l):
+			self_, cum_, name_ = l[len('import time:'):].split('|')
+			rows_.append((int(self_), int(cum_), name_.rstrip()))
+
+	total_ = next(cum for _, cum, name in rows_ if name.strip() == module)
+	heavy_ = [m for m in res_.stdout.strip().split(',') if m]
+
+	return total_, rows_, heavy_
+
+
+if __name__ == '__main__':
+
+	parser = argparse.ArgumentParser(description='import time budget check')
+	parser.add_argument('--module', action='append', help='module to import, can be given more than once (default: labeller)')
+	parser.add_argument('--budget-ms', type=float, default=100, help='largest allowed cumulative import time per module')
+	parser.add_argument('--repeat', type=int, default=5, help='how many times to import every module')
+	parser.add_argument('--show', type=int, default=10, help='how many of the slowest imports to print')
+
+	args = parser.parse_args()
+
+	failed = False
+
+	for module in args.module or ['labeller']:
+
+		runs_ = [measure(module) for _ in range(args.repeat)]
+		total_, rows_, heavy_ = min(runs_, key=lambda r: r[0])
+
+		over_ = total_/1000 > args.budget_ms
+
+		print(f'\n{module}: {total_/1000:,.1f} ms (budget {args.budget_ms:,.0f} ms){" OVER BUDGET" if over_ else ""}')
+
+		print(f'\n{"self, ms":>10} {"cumulative, ms":>15}  module')
+		for self_, cum_, name_ in sorted(rows_, key=lambda r: r[0], reverse=True)[:args.show]:
+			print(f'{self_/1000:>10.1f} {cum_/1000:>15.1f}  {name_.strip()}')
+
+		if heavy_:
+			print(f'\nFAIL: importing {module} also imports {", ".join(heavy_)}')
+
+		failed = failed or over_ or bool(heavy_)
+
+	sys.exit(1 if failed else 0)
@@ -0,0 +1,224 @@
+"""
+run a reference and a candidate labelling engine over the same corpus of events, diff their outputs event by
+event and compare throughput; exits with 1 if the labels differ or the candidate is too slow
+
+usage (from the evententities directory so that ./data can be found):
+
+	python benchmarks/parity.py --reference eventities:EventFeatureFactory --save-golden golden.json
+	python benchmarks/parity.py --golden golden.json --candidate mymodule:MyFactory [--reference eventities:EventFeatureFactory]
+									[--dedup] [--max-slowdown 0.1]
+
+the corpus is made of --size synthetic event table rows generated with --seed (see utils/make_event_dim.py) unless 
+a text file with one event description per line is given; a golden file keeps its corpus so later checks run on 
+exactly the same events. Events are labelled the way get_features, run_pipeline and backfill label them: by column, 
+with label_frame, --batch-size rows at a time. An implementation is given as module:name where name is a class 
+(instantiated with no arguments) with a label_frame(df, columns, id_column, dedup) method or a function taking 
+(df, dedup) and returning to_json() dicts in row order.
+
+The reference is always labelled event by event; --dedup labels the candidate with near-duplicate grouping so that 
+whatever grouping changes shows up as differences. An event an implementation fails on counts as a difference. 
+Throughput is only a pass/fail check when the reference is timed in the same run (--reference), the rate saved in 
+a golden file is just for information
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import importlib
+from collections import defaultdict
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from utils.make_event_dim import rows, COLUMNS
+
+# labels where the order matters (artists are ranked), compared as lists rather than sets
+ORDERED = ('artists',)
+
+# some ties (e.g. between fuzzy team matches) are broken by the order of strings in sets, which depends on the 
+# hash seed; outputs are only comparable if every run uses the same one
+HASH_SEED = '0'
+
+
+def load_labeller(spec):
+	"""
+	turn module:name into a function (data frame, dedup) -> list of to_json() dicts
+	"""
+	module_, name_ = spec.split(':')
+	obj_ = getattr(importlib.import_module(module_), name_)
+
+	if isinstance(obj_, type):
+		obj_ = obj_()
+		return lambda df, dedup: obj_.label_frame(df, list(df.columns[1:]), 'pk_event_dim', dedup)
+
+	return obj_
+
+def make_corpus(size, seed=42, data_dir='data'):
+	"""
+	return {'columns': event table columns, 'rows': rows} with size synthetic event table rows generated with seed
+	"""
+	return {'columns': list(COLUMNS), 'rows': [list(r) for r in rows(size, data_dir, seed)]}
+
+def read_corpus(file_):
+	"""
+	return a corpus like make_corpus does for a text file with one event description per line
+	"""
+	return {'columns': ['pk_event_dim', 'primary_show_desc'], 
+			'rows': [[i, l.strip()] for i, l in enumerate((l for l in open(file_) if l.strip()), 1)]}
+
+def _label(labeller, df, dedup):
+	"""
+	label data frame df; if the labeller fails, label its events one by one and return the error instead of 
+	labels for the ones it fails on
+	"""
+	try:
+		return labeller(df, dedup)
+	except Exception as e:
+		if len(df) == 1:
+			return [{'event_id': df['pk_event_dim'].tolist()[0], 'error': f'{type(e).__name__}: {e}'}]
+
+	return [ev for i in range(len(df)) for ev in _label(labeller, df.iloc[[i]], dedup)]
+
+def run(labeller, corpus, dedup=False, batch_size=5000):
+	"""
+	label every event in corpus batch_size events at a time; return outputs and events per second
+	"""
+	import pandas as pd
+
+	df_ = pd.DataFrame(corpus['rows'], columns=corpus['columns'])
+
+	t_ = time.perf_counter()
+	out_ = [ev for i in range(0, len(df_), batch_size) for ev in _label(labeller, df_.iloc[i:i + batch_size], dedup)]
+	dt_ = time.perf_counter() - t_
+
+	# outputs as they'd be after a round trip through a golden file
+	return json.loads(json.dumps(out_)), len(df_)/dt_ if dt_ else float('inf')
+
+def _as_sets(ev):
+	"""
+	return {label type: set of values} for a to_json() dict, treating the event type as just another label;
+	an event that failed has no labels
+	"""
+	if 'error' in ev:
+		return {}
+
+	sets_ = {k: set(v) for k, v in ev.items() if k not in {'event_id', 'type'} and v}
+
+	if ev.get('type'):
+		sets_['type'] = {ev['type']}
+
+	return sets_
+
+def compare(reference, candidate):
+	"""
+	compare two lists of to_json() dicts; return events that differ (including the ones either side failed on
+	and the ones with the same labels in a different order where order matters) and precision/recall of the 
+	candidate per label type, taking the reference as the truth
+	"""
+	counts_ = defaultdict(lambda: {'tp': 0, 'fp': 0, 'fn': 0})
+	diffs_ = []
+
+	for ref_, cand_ in zip(reference, candidate):
+
+		r_, c_ = _as_sets(ref_), _as_sets(cand_)
+
+		if (r_ != c_) or ('error' in ref_) or ('error' in cand_) \
+				or any(list(ref_.get(k) or []) != list(cand_.get(k) or []) for k in ORDERED):
+			diffs_.append((ref_.get('event_id'), ref_, cand_))
+
+		for k in set(r_) | set(c_):
+			rk, ck = r_.get(k, set()), c_.get(k, set())
+			counts_[k]['tp'] += len(rk & ck)
+			counts_[k]['fp'] += len(ck - rk)
+			counts_[k]['fn'] += len(rk - ck)
+
+	scores_ = {k: {'precision': c['tp']/(c['tp'] + c['fp']) if c['tp'] + c['fp'] else 1.0,
+					'recall': c['tp']/(c['tp'] + c['fn']) if c['tp'] + c['fn'] else 1.0, **c}
+				for k, c in counts_.items()}
+
+	return diffs_, scores_
+
+
+if __name__ == '__main__':
+
+	if os.environ.get('PYTHONHASHSEED') != HASH_SEED:
+		os.execve(sys.executable, [sys.executable] + sys.argv, {**os.environ, 'PYTHONHASHSEED': HASH_SEED})
+
+	parser = argparse.ArgumentParser(description='labelling engine parity and performance check')
+	parser.add_argument('corpus', nargs='?', help='text file with one event description per line instead of synthetic events')
+	parser.add_argument('--size', type=int, default=3000, help='how many synthetic events to make if there\'s no corpus file')
+	parser.add_argument('--seed', type=int, default=42, help='seed for the synthetic events')
+	parser.add_argument('--data-dir', default=os.path.join(os.path.curdir, 'data'))
+	parser.add_argument('--reference', help='implementation to run as the reference, e.g. eventities:EventFeatureFactory')
+	parser.add_argument('--candidate', help='implementation to check against the reference')
+	parser.add_argument('--golden', help='use outputs (and the corpus) saved earlier with --save-golden instead of the reference\'s')
+	parser.add_argument('--save-golden', help='save reference outputs to this file')
+	parser.add_argument('--dedup', action='store_true', help='label the candidate with near-duplicate grouping')
+	parser.add_argument('--batch-size', type=int, default=5000, help='how many events to label at a time')
+	parser.add_argument('--max-slowdown', type=float, default=0.1, help='largest allowed throughput drop, 0.1 is 10%%')
+	parser.add_argument('--show', type=int, default=10, help='how many differing events to print')
+
+	args = parser.parse_args()
+
+	if not (args.golden or args.reference):
+		parser.error('need a --golden file or a --reference to run')
+
+	golden_ = json.load(open(args.golden)) if args.golden else None
+
+	if args.corpus:
+		corpus = read_corpus(args.corpus)
+	elif golden_:
+		corpus = golden_['corpus']
+	else:
+		corpus = make_corpus(args.size, args.seed, args.data_dir)
+
+	if golden_ and (corpus != golden_['corpus']):
+		sys.exit(f'the corpus isn\'t the one {args.golden} was made with')
+
+	print(f'corpus: {len(corpus["rows"]):,} events')
+
+	# the rate is only worth comparing with if it's been measured here and now
+	if args.reference:
+		reference, ref_rate = run(load_labeller(args.reference), corpus, batch_size=args.batch_size)
+		print(f'reference: {ref_rate:,.1f} events/sec')
+
+	if golden_:
+		reference = golden_['events']
+		if not args.reference:
+			ref_rate = golden_['events_per_sec']
+			print(f'reference: {ref_rate:,.1f} events/sec as saved in {args.golden}, for information only')
+
+	if args.save_golden:
+		json.dump({'corpus': corpus, 'events': reference, 'events_per_sec': ref_rate}, open(args.save_golden, 'w'))
+		print(f'saved reference outputs to {args.save_golden}')
+
+	if not args.candidate:
+		sys.exit(0)
+
+	candidate, cand_rate = run(load_labeller(args.candidate), corpus, args.dedup, args.batch_size)
+
+	print(f'candidate{" with dedup" if args.dedup else ""}: {cand_rate:,.1f} events/sec ({cand_rate/ref_rate - 1:+.1%})')
+
+	diffs_, scores_ = compare(reference, candidate)
+
+	print(f'\n{"label":>22} {"precision":>10} {"recall":>8} {"tp":>8} {"fp":>6} {"fn":>6}')
+	for k in sorted(scores_):
+		s = scores_[k]
+		print(f'{k:>22} {s["precision"]:>10.4f} {s["recall"]:>8.4f} {s["tp"]:>8} {s["fp"]:>6} {s["fn"]:>6}')
+
+	print(f'\n{len(diffs_):,} events with different labels')
+
+	descriptions_ = {str(r[0]): ' | '.join(str(v) for v in r[1:] if v is not None) for r in corpus['rows']}
+
+	for ev_id, ref_, cand_ in diffs_[:args.show]:
+		print(f'\nevent {ev_id}: {descriptions_.get(str(ev_id), "")}')
+		print(f'{"reference":>12}: {ref_}')
+		print(f'{"candidate":>12}: {cand_}')
+
+	too_slow = bool(args.reference) and (cand_rate < ref_rate*(1 - args.max_slowdown))
+
+	if too_slow:
+		print(f'\nFAIL: candidate throughput dropped by more than {args.max_slowdown:.0%}')
+
+	sys.exit(1 if (diffs_ or too_slow) else 0)
@@ -0,0 +1,81 @@
+import zlib
+import random
+import numpy as np
+from collections import defaultdict
+
+class MinHashLSH:
+
+	"""
+	group near-duplicate descriptions: MinHash signatures over word shingles, then locality sensitive hashing
+	so that only descriptions sharing a band of their signatures are compared
+	"""
+	# hashes are taken modulo a 31-bit Mersenne prime so that a*h + b always fits in 64 bits
+	PRIME = (1 << 31) - 1
+
+	def __init__(self, num_perm=64, bands=16, shingle=2, threshold=0.7, seed=42):
+
+		if num_perm % bands:
+			raise ValueError(f'num_perm ({num_perm}) must be a multiple of bands ({bands})')
+
+		self.num_perm = num_perm
+		self.bands = bands
+		self.rows = num_perm//bands
+		self.shingle = shingle
+		self.threshold = threshold
+
+		rnd_ = random.Random(seed)
+		self._a = np.array([rnd_.randrange(1, self.PRIME) for _ in range(num_perm)], dtype=np.uint64)
+		self._b = np.array([rnd_.randrange(0, self.PRIME) for _ in range(num_perm)], dtype=np.uint64)
+
+	def shingles(self, s):
+		"""
+		return the set of word shingles in (normalized) description s; short descriptions are a single shingle
+		"""
+		toks_ = s.split()
+
+		if len(toks_) <= self.shingle:
+			return {s}
+
+		return {' '.join(toks_[i:i + self.shingle]) for i in range(len(toks_) - self.shingle + 1)}
+
+	def signature(self, s):
+
+		h_ = np.array([zlib.crc32(sh.encode()) % self.PRIME for sh in self.shingles(s)], dtype=np.uint64)
+
+		return ((self._a[:, None]*h_[None, :] + self._b[:, None]) % self.PRIME).min(axis=1)
+
+	def clusters(self, docs):
+		"""
+		return clusters of near-duplicates in docs as lists of positions; the first position in every
+		cluster is its representative
+		"""
+		sigs_ = [self.signature(d) if d else None for d in docs]
+
+		parent_ = list(range(len(docs)))
+
+		def _root(i):
+			while parent_[i] != i:
+				parent_[i] = parent_[parent_[i]]
+				i = parent_[i]
+			return i
+
+		buckets_ = defaultdict(list)
+
+		for i, sig in enumerate(sigs_):
+			if sig is not None:
+				for b in range(self.bands):
+					buckets_[(b, sig[b*self.rows:(b + 1)*self.rows].tobytes())].append(i)
+
+		for members in buckets_.values():
+			for j in members[1:]:
+				ri, rj = _root(members[0]), _root(j)
+				# share of equal minhashes estimates Jaccard similarity of the shingle sets
+				if (ri != rj) and (np.mean(sigs_[ri] == sigs_[j]) >= self.threshold):
+					parent_[max(ri, rj)] = min(ri, rj)
+
+		clusters_ = defaultdict(list)
+
+		for i in range(len(docs)):
+			clusters_[_root(i)].append(i)
+
+		return list(clusters_.values())
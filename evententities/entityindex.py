@@ -0,0 +1,182 @@
+import json
+import zlib
+import sqlite3
+from collections import defaultdict
+
+def _encode(ids):
+	"""
+	compress a sorted list of event ids: deltas between neighbours as varints, then zlib
+	"""
+	out_ = bytearray()
+	prev_ = 0
+
+	for i in ids:
+		d = i - prev_
+		prev_ = i
+		while d > 0x7f:
+			out_.append((d & 0x7f) | 0x80)
+			d >>= 7
+		out_.append(d)
+
+	return zlib.compress(bytes(out_))
+
+def _decode(blob):
+
+	ids_ = []
+	cur_ = shift_ = 0
+	prev_ = 0
+
+	for b in zlib.decompress(blob):
+		cur_ |= (b & 0x7f) << shift_
+		if b & 0x80:
+			shift_ += 7
+		else:
+			prev_ += cur_
+			ids_.append(prev_)
+			cur_ = shift_ = 0
+
+	return ids_
+
+
+class EntityIndex:
+
+	"""
+	on-disk inverted index from (entity type, entity) to the sorted ids of the events labelled with it;
+	events labelled with a year also get a ('year', year) posting. What every event is labelled with is
+	kept too so that adding an event again replaces its postings
+	"""
+	# how many ids to look up in one query, sqlite allows 999 parameters
+	MAX_IDS = 900
+
+	def __init__(self, file_):
+
+		self.conn = sqlite3.connect(file_)
+		self.conn.execute("""CREATE TABLE IF NOT EXISTS postings (type TEXT, entity TEXT, ids BLOB,
+								PRIMARY KEY (type, entity)) WITHOUT ROWID;""")
+		self.conn.execute('CREATE TABLE IF NOT EXISTS labels (id INTEGER PRIMARY KEY, pairs TEXT);')
+
+	def close(self):
+
+		self.conn.close()
+
+	@staticmethod
+	def _key(type_, entity):
+		return type_, str(entity).lower().strip()
+
+	@staticmethod
+	def _labels(ev):
+		"""
+		return (type, entity) pairs for a to_json() dict
+		"""
+		pairs_ = [(k, v) for k, vs in ev.items() if k not in {'event_id', 'type'} and vs for v in vs]
+
+		if ev.get('type'):
+			pairs_.append(('type', ev['type']))
+
+		return pairs_
+
+	def postings(self, type_, entity):
+		"""
+		return sorted ids of the events with entity of type type_
+		"""
+		row_ = self.conn.execute('SELECT ids FROM postings WHERE type = ? AND entity = ?;', self._key(type_, entity)).fetchone()
+
+		return _decode(row_[0]) if row_ else []
+
+	def _update(self, changes, add):
+
+		with self.conn:
+			for key, ids in changes.items():
+
+				current_ = set(self.postings(*key))
+				new_ = (current_ | ids) if add else (current_ - ids)
+
+				if new_:
+					self.conn.execute('INSERT OR REPLACE INTO postings VALUES (?, ?, ?);', (*key, _encode(sorted(new_))))
+				else:
+					self.conn.execute('DELETE FROM postings WHERE type = ? AND entity = ?;', key)
+
+	def _indexed(self, ids):
+		"""
+		return {event id: [(type, entity), ..]} for those of event ids ids that have been added before
+		"""
+		ids = list(ids)
+		pairs_ = {}
+
+		for i in range(0, len(ids), self.MAX_IDS):
+			chunk_ = ids[i:i + self.MAX_IDS]
+			for id_, p_ in self.conn.execute(f'SELECT id, pairs FROM labels WHERE id IN ({", ".join("?"*len(chunk_))});', chunk_):
+				pairs_[id_] = [tuple(k) for k in json.loads(p_)]
+
+		return pairs_
+
+	def add(self, events, years=None):
+		"""
+		add postings for labelled events (to_json() dicts), replacing the ones an event had if it's been added 
+		before; years is an optional {event id: year}
+		"""
+		changes_ = defaultdict(set)
+		keys_ = {}
+
+		for ev in events:
+			id_ = int(ev['event_id'])
+			keys_[id_] = sorted({self._key(type_, entity) for type_, entity in self._labels(ev)})
+			for k in keys_[id_]:
+				changes_[k].add(id_)
+
+		removed_ = defaultdict(set)
+
+		for id_, old_keys in self._indexed(keys_).items():
+			for k in set(old_keys) - set(keys_[id_]):
+				removed_[k].add(id_)
+
+		self._update(removed_, add=False)
+
+		for ev_id, year in (years or {}).items():
+			if year is not None:
+				changes_[self._key('year', year)].add(int(ev_id))
+
+		self._update(changes_, add=True)
+
+		with self.conn:
+			self.conn.executemany('INSERT OR REPLACE INTO labels VALUES (?, ?);', [(id_, json.dumps(k)) for id_, k in keys_.items()])
+
+		return self
+
+	def remove(self, events):
+		"""
+		remove postings for labelled events (to_json() dicts); years are left alone
+		"""
+		events = list(events)
+		changes_ = defaultdict(set)
+
+		for ev in events:
+			id_ = int(ev['event_id'])
+			for type_, entity in self._labels(ev):
+				changes_[self._key(type_, entity)].add(id_)
+
+		self._update(changes_, add=False)
+
+		with self.conn:
+			self.conn.executemany('DELETE FROM labels WHERE id = ?;', [(int(ev['event_id']),) for ev in events])
+
+		return self
+
+	def query(self, all_of=(), any_of=()):
+		"""
+		return sorted ids of the events that have every (type, entity) in all_of and, if any_of
+		is given, at least one (type, entity) in any_of
+		"""
+		ids_ = None
+
+		# start from the shortest posting list
+		for p_ in sorted([self.postings(type_, entity) for type_, entity in all_of], key=len):
+			ids_ = set(p_) if ids_ is None else ids_.intersection(p_)
+			if not ids_:
+				return []
+
+		if any_of:
+			u_ = set().union(*[self.postings(type_, entity) for type_, entity in any_of])
+			ids_ = u_ if ids_ is None else ids_ & u_
+
+		return sorted(ids_ or [])
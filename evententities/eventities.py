@@ -1,320 +1,179 @@
-from collections import defaultdict
-import pandas as pd
 import json
-import arrow
-from weakref import WeakKeyDictionary
-import string
-import re
 import os
-import enchant
-from artistnormaliser import ArtistNameNormaliser
-from typing import NamedTuple
-
 import time
-import sqlalchemy
-from sqlalchemy.orm.session import sessionmaker
-
-import jellyfish
-import itertools
+import uuid
+import socket
+import threading
+import queue
+import contextlib
 
-class Artist(NamedTuple):
+# the event classes used to live here, keep them importable from eventities
+from labeller import Artist, String, Event, SlimEvent, EventBatch, EntityDictionaries, EventLabeller
+from relabel import DescriptionIndex, append_descriptions, dictionary_entries, diff_entries, entry_name
+from entityindex import EntityIndex
 
-	name: str
-	words_in_name: float
-	uncommon_words_in_name: float
-	popularity: float
-	award_winner: float
-	performed_in_australia: float
-	possibly_dead: float
-	score: float=0
+# pandas, sqlalchemy and arrow are imported by the methods that use them, see labeller for why
 
 
-class String:
+class SnapshotWriter:
 
 	"""
-	descriptor that requires property to be a string; for explanation of descriptors
-	see http://nbviewer.jupyter.org/urls/gist.github.com/ChrisBeaumont/5758381/raw/descriptor_writeup.ipynb
+	write raw events to a feather, parquet or csv (tab-separated gzip) snapshot one data frame at a time; 
+	everything goes to a temporary file that replaces file_ only when the writer is closed
 	"""
+	def __init__(self, file_, fmt, compression='zstd'):
 
-	def __init__(self, value_default):
+		self.file_ = file_
+		self.fmt = fmt
+		self.compression = compression
+		self.tmp_ = f'{file_}.{os.getpid()}.tmp'
+		self.rows = 0
+		self.columns = None
 
-		# value_default is the default value any String instance will be initialized with; 
-		# it could be None or something else
+		self._schema = None
+		self._writer = None
 
-		self.value = value_default
-		self.data = WeakKeyDictionary()
+	def write(self, events):
 
-	def __get__(self, instance, owner):
+		if self.columns is None:
+			self.columns = list(events.columns)
 
-		# instance is the instance (say, x) that calls get on an String-instance property d: like x.d
-		# owner: this is effectively the Event class that "owns" this descriptor (because descriptor
-		# instances will have to be **class** variables)
+		if self.fmt == 'csv':
+			events.to_csv(self.tmp_, sep='\t', index=False, compression='gzip', mode='a', header=(self.rows == 0))
+		else:
+			import pyarrow
 
-		return self.data.get(instance, self.value)
+			if self._schema is None:
+				# columns that are all missing in the first frame are taken to be text
+				schema_ = pyarrow.Schema.from_pandas(events, preserve_index=False)
+				self._schema = pyarrow.schema([f.with_type(pyarrow.string()) if pyarrow.types.is_null(f.type) else f 
+													for f in schema_]).remove_metadata()
 
-	def __set__(self, instance, value):
+			table_ = pyarrow.Table.from_pandas(events, schema=self._schema, preserve_index=False)
 
-		if not isinstance(value, str):
-			self.data[instance] = None
-		else:
-			self.data[instance] = value
+			if self._writer is None:
+				if self.fmt == 'feather':
+					import pyarrow.ipc
+					self._writer = pyarrow.ipc.new_file(self.tmp_, self._schema, 
+											options=pyarrow.ipc.IpcWriteOptions(compression=self.compression))
+				else:
+					import pyarrow.parquet
+					self._writer = pyarrow.parquet.ParquetWriter(self.tmp_, self._schema, compression=self.compression)
 
-class Event:
-	"""
-	representation of a basic event
-	"""
-	description = String('')
-	entertainment_type = String('')
-
-	def __init__(self, event_id, timestamp=None, description=None, entertainment_type=None):
-
-		# event id comes from an event table, it's a label we assign and do nothing with
-		self._ev_id = event_id
-		self._timestamp = timestamp
-		# description is a string containing basic info about an event
-		self.description = description
-		# entertainment_type is a high-level event type like sports or music or something
-		self.entertainment = entertainment_type
-		# every event instance will have its features (labels)
-		self._labels = defaultdict()
-	
-	@property
-	def ev_id(self):
-		return self._ev_id
-
-	@ev_id.setter
-	def ev_id(self, value):
-		if isinstance(value, int):
-			self._ev_id = value
-
-	@property
-	def timestamp(self):
-		return self._timestamp
-
-	@timestamp.setter
-	def timestamp(self, value):
-		if isinstance(value, str):
-			self._timestamp = value
-
-	def show(self):
-
-		print()
-		print(f'ID:')
-		print(f'{" ":>18}{self._ev_id}')
-		print(f'DESCRIPTION:')
-		print(f'{" ":>18}{self.description}')
-		print('LABELS:')
-		print()
-		for lab in self._labels:
-			print(f'{lab:>16}: {", ".join(self._labels[lab])}')
-		print()
-		print(f'ENTERTAINMENT TYPE: {self.entertainment}')
-		print()
-
-	def get_type(self):
-		"""
-		decide what event type it is based on labels
-		"""
-		words_in_descr_ = set(self.description.lower().split())
-		descr_norm_ = ' '.join(self.description.lower().split())
-
-		conditions = {'concert': any([{'artists', 'promoters'} < set(self._labels),
-										('artists' in self._labels) and ({'guest', 'featuring', 'feat', 'with', 
-											'headline', 'presents', 'vinyl', 'cd', 'tour'} & words_in_descr_),
-												'doors open' in descr_norm_]),
-
-					  'special interest': {'boxers', 'psychics', 'life_coaches', 'motivational_speakers'} & set(self._labels),
-					  'sport': any([len(self._labels.get('teams', [])) == 2,
-										{'sport_venues', 'sport_names'} < set(self._labels)]),
-					  'circus': 'circuses' in self._labels}
-
-		for tp in conditions:
-
-			if conditions[tp]:
-				self.entertainment = tp
-				break
+			self._writer.write_table(table_)
+
+		self.rows += len(events)
 
 		return self
 
-	def to_json(self):
+	def close(self):
+		"""
+		put the snapshot in place; return False if nothing has been written
+		"""
+		if self._writer is not None:
+			self._writer.close()
+
+		if not os.path.exists(self.tmp_):
+			return False
+
+		os.replace(self.tmp_, self.file_)
+
+		return True
+
+	def abort(self):
+
+		if self._writer is not None:
+			self._writer.close()
+
+		if os.path.exists(self.tmp_):
+			os.remove(self.tmp_)
 
-		return {**{'event_id': self._ev_id, 'type': self.entertainment}, **{l: list(self._labels[l]) for l in self._labels}}
-	
 
-class EventFeatureFactory(ArtistNameNormaliser):
+class EventFeatureFactory(EventLabeller):
 	
 	"""
 	class to connect to venue tables and get all useful data
 	"""
-	def __init__(self, reset_tracking=False):
+	# event table columns that we collect; the primary key must be first
+	EVENT_COLUMNS = ('pk_event_dim', 'primary_show_desc', 'performance_time', 'title_who', 'title_where', 'title_when',
+						'title1', 'title2', 'title3', 'title4', 'title5', 'title6')
+	# event table columns that differ between sessions of the same show and are ignored when grouping
+	CLUSTER_IGNORE_COLUMNS = ('performance_time', 'title_where', 'title_when')
+	# formats raw event snapshots can be saved in and their file extensions; feather and parquet need pyarrow
+	SNAPSHOT_FORMATS = {'feather': '.feather', 'parquet': '.parquet', 'csv': '.csv.gz'}
+
+	def __init__(self, reset_tracking=False, field_routes=None):
 
 		self.EVENT_TBL = 'DWSales.dbo.event_dim'
 
 		self.NEWEVENT_DIR = os.path.join(os.path.curdir, 'new_events')
+		self.MANIFEST_FILE = os.path.join(self.NEWEVENT_DIR, 'manifest.json')
 		self.OLDEVENT_DIR = os.path.join(os.path.curdir, 'old_events')
 		self.OLDEVENT_FILENAME = 'old_events.txt'
 		self.OLDEVENT_FILE = os.path.join(self.OLDEVENT_DIR, self.OLDEVENT_FILENAME)
 
+		self.JSON_DIR = os.path.join(os.path.curdir, 'features')
+		self.JSON_FILENAME = 'features.json'
+		self.JSON_FILE = os.path.join(self.JSON_DIR, self.JSON_FILENAME)
+		# labels written since the features file was last rewritten, one event per line; see _merge_features
+		self.FEATURES_LOG_FILE = os.path.join(self.JSON_DIR, 'features.jsonl')
+		self.BACKFILL_DIR = os.path.join(self.JSON_DIR, 'backfill')
+		# chunk size all backfill ranges were made with
+		self.BACKFILL_SETTINGS_FILE = os.path.join(self.BACKFILL_DIR, 'backfill.json')
+
 		if reset_tracking:
 			try:
 				os.remove(self.OLDEVENT_FILE)
 				print(f'reset event primary keys tracking - deleted {self.OLDEVENT_FILE}..')
 			except:
 				pass
+			# committed backfill ranges count as processed too
+			if os.path.isdir(self.BACKFILL_DIR):
+				for f in os.listdir(self.BACKFILL_DIR):
+					if (f.startswith('range_') and f.endswith('.json')) or (f == os.path.basename(self.BACKFILL_SETTINGS_FILE)):
+						os.remove(os.path.join(self.BACKFILL_DIR, f))
+				print(f'reset backfill tracking - deleted committed ranges in {self.BACKFILL_DIR}..')
+		self.DESCR_FILE = os.path.join(self.JSON_DIR, 'descriptions.jsonl')
+		self.DICT_SNAPSHOT_FILE = os.path.join(self.JSON_DIR, 'dictionaries.json')
+		self.INDEX_FILE = os.path.join(self.JSON_DIR, 'entities.db')
+		# held while features, descriptions and the entity index are updated as several processes may do it
+		self.LOCK_FILE = os.path.join(self.JSON_DIR, 'features.lock')
+
+		# these are only created when something needs to be written there, see _ensure_dirs
+		self.REQ_DIRS = [self.NEWEVENT_DIR, self.OLDEVENT_DIR, self.JSON_DIR]	
 
-		self.JSON_DIR = os.path.join(os.path.curdir, 'features')
-		self.JSON_FILENAME = 'features.json'
-		self.JSON_FILE = os.path.join(self.JSON_DIR, self.JSON_FILENAME)
+		super().__init__(field_routes=field_routes)
 
-		self.REQ_DIRS = [self.NEWEVENT_DIR, self.OLDEVENT_DIR, self.JSON_DIR]	
+	def _ensure_dirs(self):
 
 		for d in self.REQ_DIRS:
 			if not os.path.exists(d):
 				os.mkdir(d)
 
-		self.spell_checker = enchant.Dict("en_US")
-
-		self.DATA_DIR = os.path.join(os.path.curdir, 'data')
-
-		# geo
-
-		self.GEO_DIR = os.path.join(self.DATA_DIR, 'geo')
-
-		self._countries, self._suburbs = [json.load(open(os.path.join(self.GEO_DIR, f + '.json'))) 
-			for f in ['countries', 'suburbs']]
-
-		# sports
-
-		self.SPORTS_DIR = os.path.join(self.DATA_DIR,'sports')
-
-		self._teams, self._sport_names, self._tournaments, \
-			self._tournament_types, self._sponsors, self._sport_venues = \
-				[json.load(open(os.path.join(self.SPORTS_DIR, f + '.json'))) 
-			for f in ['teams', 
-						'sport-names', 
-							'tournaments',
-								'tournament-types',
-									'sponsors',
-										'sport-venues']]
-
-		self._team_names_only = {self.normalize(n) for l in self._teams for n in self._teams[l]}
-
-		# music
-
-		self.MUSIC_DIR = os.path.join(self.DATA_DIR, 'music')
-
-		self._promoters = json.load(open(os.path.join(self.MUSIC_DIR, 'data_promoters.json')))
-		self._music_venues = json.load(open(os.path.join(self.MUSIC_DIR, 'data_music-venues.json')))
-
-		self._artists = json.load(open(os.path.join(self.MUSIC_DIR, 'data_artists.json')))
-		self._major_music_genres = json.load(open(os.path.join(self.MUSIC_DIR, 'data_major-music-genres.json')))
-
-		self._dead_bands = json.load(open(os.path.join(self.MUSIC_DIR, 'dead_bands.json')))
-
-		self._award_winners = [self.normalize(a) for a in json.load(open(os.path.join(self.MUSIC_DIR, 'award_winners.json')))]
-
-		self._artists_popular = self._normalize_dict(json.load(open(os.path.join(self.MUSIC_DIR, 'top_artists.json'))))
-
-		self._aus_gig_artists = self._normalize_dict(json.load(open(os.path.join(self.MUSIC_DIR, 'aus_gig_artists.json'))))
-
-		# musicals
-
-		self.MUSICAL_DIR = os.path.join(self.DATA_DIR, 'musical')
-
-		self._musicals = json.load(open(os.path.join(self.MUSICAL_DIR, 'musicals.json')))
-
-		# opera
-
-		self.OPERA_DIR = os.path.join(self.DATA_DIR, 'opera')
-
-		self._opera_singers = json.load(open(os.path.join(self.OPERA_DIR, 'singers.json')))
-
-		# comedy
-
-		self.COMEDY_DIR = os.path.join(self.DATA_DIR, 'comedy')
-
-		self._comedians = json.load(open(os.path.join(self.COMEDY_DIR, 'comedians.json')))
-
-		# circus
-
-		self.CIRCUS_DIR = os.path.join(self.DATA_DIR, 'circus')
-
-		self._circuses = json.load(open(os.path.join(self.CIRCUS_DIR, 'circus.json')))
-
-		# special interests
-
-		self.SPECIAL_DIR = os.path.join(self.DATA_DIR, 'special')
-
-		self._life_coaches, self._boxers, self._psychics, self._motivational_speakers = [json.load(open(os.path.join(self.SPECIAL_DIR, f + '.json'))) 
-												for f in ['life_coaches', 'boxers', 'psychics', 'motivational_speakers']]
-
-		self.COMPANY_DIR = os.path.join(self.DATA_DIR, 'companies')
-
-		self._companies = json.load(open(os.path.join(self.COMPANY_DIR, 'companies.json')))
-
-		self.MOVIE_DIR = os.path.join(self.DATA_DIR, 'movie')
-
-		self._movies = json.load(open(os.path.join(self.MOVIE_DIR, 'movies.json')))
-
-		self.FESTIVAL_DIR = os.path.join(self.DATA_DIR, 'festivals')
-
-		self._festivals = self._normalize_dict(json.load(open(os.path.join(self.FESTIVAL_DIR, 'festivals.json'))))
-
-		self.MISC_DIR = os.path.join(self.DATA_DIR, 'misc')
-		self._purchase_types = json.load(open(os.path.join(self.MISC_DIR, 'data_purchase-types.json')))
-		self._venue_types = json.load(open(os.path.join(self.MISC_DIR, 'data_venue-types.json')))
-
-		self._NES = {'suburbs': self._suburbs, 
-					 'musicals': self._musicals, 
-					 'artists': self._artists, 
-					 'movies': self._movies,
-					 'promoters': self._promoters, 
-					 'opera_singers': self._opera_singers,
-					 'countries': self._countries, 
-					 'companies': self._companies,
-					 'teams': self._teams,
-					 'sport_names': self._sport_names, 
-					 'venue_types': self._venue_types,
-					 'sport_venues': self._sport_venues,
-					 'major_music_genres': self._major_music_genres, 
-					 'music_venues': self._music_venues,
-					 'festivals': self._festivals,
-					 'tournament_types': self._tournament_types,
-					 'tournaments': self._tournaments, 
-					 'sponsors': self._sponsors,
-					 'purchase_types': self._purchase_types, 
-					 'comedians': self._comedians,
-					 'life_coaches': self._life_coaches,
-					 'boxers': self._boxers,
-					 'psychics': self._psychics,
-					 'circuses': self._circuses,
-					 'motivational_speakers': self._motivational_speakers}
-
-	def _normalize_dict(self, dict_):
+	def start_session(self, rds_creds_=None, url=None):
 		"""
-		return a dictionary indexed by first letter with all entries normalized
+		connect to the MSSQL server with credentials in file rds_creds_ or, if url is given, to any database
+		sqlalchemy can connect to, e.g. sqlite:///event_dim.db made by utils/make_event_dim.py
 		"""
-		ndict_ = defaultdict(list)
+		import sqlalchemy
+		from sqlalchemy.orm.session import sessionmaker
 
-		for _ in {self.normalize(f) for l in dict_ for f in dict_[l]}:
-			ndict_[_[0]].append(_)
+		print('starting sqlalchemy session...', end='')
 
-		return ndict_
+		if url is None:
 
-	def start_session(self, rds_creds_):
+			sql_keys_required = set('user user_pwd server port db_name'.split())
 
-		print('starting sqlalchemy session...', end='')
+			sql_creds = json.load(open(rds_creds_))
 
-		sql_keys_required = set('user user_pwd server port db_name'.split())
+			if sql_keys_required != set(sql_creds):
+				raise KeyError(f'RDS SQL Credentials are incomplete! The following keys are missing: '
+					f'{", ".join([k for k in sql_keys_required - set(sql_creds)])}')
 
-		sql_creds = json.load(open(rds_creds_))
+			url = (f'mssql+pymssql://{sql_creds["user"]}:{sql_creds["user_pwd"]}'
+						f'@{sql_creds["server"]}:{sql_creds["port"]}/{sql_creds["db_name"]}')
 
-		if sql_keys_required != set(sql_creds):
-			raise KeyError(f'RDS SQL Credentials are incomplete! The following keys are missing: '
-				f'{", ".join([k for k in sql_keys_required - set(sql_creds)])}')
-
-		self._ENGINE = sqlalchemy.create_engine(f'mssql+pymssql://{sql_creds["user"]}:{sql_creds["user_pwd"]}'
-													f'@{sql_creds["server"]}:{sql_creds["port"]}/{sql_creds["db_name"]}')
+		self._ENGINE = sqlalchemy.create_engine(url)
 		self._SESSION = sessionmaker(autocommit=True, bind=self._ENGINE)
 
 		self.sess = self._SESSION()
@@ -336,6 +195,10 @@ class EventFeatureFactory(ArtistNameNormaliser):
 		"""
 		check if a table tab exists; return 1 if it does or 0 otherwise
 		"""
+		if self._ENGINE.dialect.name != 'mssql':
+			import sqlalchemy
+			return int(sqlalchemy.inspect(self._ENGINE).has_table(tab))
+
 		return self.sess.execute(f""" IF OBJECT_ID(N'{tab}', N'U') IS NOT NULL
 											SELECT 1
 										ELSE
@@ -374,6 +237,8 @@ class EventFeatureFactory(ArtistNameNormaliser):
 		except:
 			old_event_pks = set()
 
+		old_event_pks |= self.backfilled_pks()
+
 		self.NEW_EVENT_PKS = current_pks - old_event_pks
 
 		print(f'found {len(self.NEW_EVENT_PKS):,} new events...')
@@ -381,330 +246,793 @@ class EventFeatureFactory(ArtistNameNormaliser):
 		return self
 
 
-	def get_events(self):
+	def get_events(self, strategy='auto', chunksize=50000):
 		"""
-		download relevant columns for the events with primary keys that we are interested in
+		download relevant columns for the events with primary keys that we are interested in; strategy decides how:
+
+			'in'		ask for the new keys only, fewer than 10,000 keys per query
+			'scan'		read the whole table and keep the new keys
+			'chunked'	same as 'scan' but chunksize rows at a time so the whole table is never in memory
+			'auto'		'in' if there are fewer than 10,000 new keys and 'scan' otherwise
 		"""
 
+		import pandas as pd
+
 		if not self.NEW_EVENT_PKS:
 			print('no new events today...')
 			return self
 
-		pks_ = """pk_event_dim primary_show_desc performance_time title_who title_where title_when
-					title1 title2 title3 title4 title5 title6""".split()
+		# https://docs.microsoft.com/en-us/sql/sql-server/maximum-capacity-specifications-for-sql-server
+		MAX_IN_KEYS = 9999
+
+		if strategy == 'auto':
+			strategy = 'in' if len(self.NEW_EVENT_PKS) <= MAX_IN_KEYS else 'scan'
+
+		if strategy not in {'in', 'scan', 'chunked'}:
+			raise ValueError(f'unknown strategy {strategy}')
 
 		if not self.exists(self.EVENT_TBL):
 			raise Exception(f'table {self.EVENT_TBL} doesn\'t exist!')
 		else:
 			print(f'table {self.EVENT_TBL} exists...')	
 
-		# https://docs.microsoft.com/en-us/sql/sql-server/maximum-capacity-specifications-for-sql-server
+		q_ = f'SELECT {",".join(self.EVENT_COLUMNS)} FROM {self.EVENT_TBL}'
 
-		if len(self.NEW_EVENT_PKS) < 10000:
+		if strategy == 'in':
+
+			pks_ = sorted(self.NEW_EVENT_PKS)
+			chunks_ = [pd.read_sql(f"{q_} WHERE pk_event_dim in ({', '.join(pks_[i:i + MAX_IN_KEYS])});", self._ENGINE) 
+							for i in range(0, len(pks_), MAX_IN_KEYS)]
+
+		elif strategy == 'scan':
+
+			events_ = pd.read_sql(f'{q_};', self._ENGINE)
+			chunks_ = [events_[events_['pk_event_dim'].astype(str).isin(self.NEW_EVENT_PKS)]]
 
-			self.events_ = pd.read_sql(f"""
-								SELECT {','.join(pks_)}
-								FROM {self.EVENT_TBL} WHERE pk_event_dim in ({', '.join(self.NEW_EVENT_PKS)});				
-								""", self._ENGINE)
 		else:
 
-			self.events_ = pd.read_sql(f"""
-								SELECT {','.join(pks_)}
-								FROM {self.EVENT_TBL};				
-								""", self._ENGINE).query(f"pk_event_dim in ({', '.join(self.NEW_EVENT_PKS)})")
+			chunks_ = [chunk[chunk['pk_event_dim'].astype(str).isin(self.NEW_EVENT_PKS)] 
+							for chunk in pd.read_sql(f'{q_};', self._ENGINE, chunksize=chunksize)]
+
+		self.events_ = pd.concat(chunks_, ignore_index=True) if len(chunks_) > 1 else chunks_[0].reset_index(drop=True)
 
 		print(f'collected {len(self.events_):,} rows')
 
 		return self
 
-	def save(self, tofile=None):
+	def save(self, tofile=None, fmt='feather', compression='zstd'):
+		"""
+		save collected events as a snapshot in NEWEVENT_DIR and register it in the snapshot manifest so that 
+		from_snapshots can find it; fmt is feather, parquet or csv (tab-separated gzip), a tofile with one of 
+		the known extensions decides the format by itself. Without pyarrow snapshots are saved as csv
+		"""
+		self._ensure_dirs()
 
-		if not tofile:
-			file_ = f'events_{arrow.utcnow().to("Australia/Sydney").format("YYYYMMDD")}.csv.gz'
-		else:
-			file_ = tofile
+		file_, fmt = self._snapshot_file(tofile, fmt, 'YYYYMMDD')
 
-		self.events_.to_csv(self.NEWEVENT_DIR + '/' + file_, sep='\t', index=False, compression='gzip')
+		writer_ = SnapshotWriter(os.path.join(self.NEWEVENT_DIR, file_), fmt, compression)
 
-		print(f'saved to a tab-separated file {file_} in {self.NEWEVENT_DIR}')
+		try:
+			writer_.write(self.events_)
+		except:
+			writer_.abort()
+			raise
+
+		writer_.close()
+
+		self._register_snapshot(file_, fmt, len(self.events_), list(self.events_.columns))
+
+		print(f'saved to {fmt} snapshot {file_} in {self.NEWEVENT_DIR}')
 
 		return self
 
-	def find_matches(self, st, items):
+	def _snapshot_file(self, tofile, fmt, stamp):
 		"""
-		generic matcher: find items in string st
+		return snapshot file name and format: a tofile with one of the known extensions decides the format, 
+		without tofile the name has today's date formatted as stamp. Without pyarrow it's always csv
 		"""
+		import arrow
 
-		found = set()
+		if tofile:
+			fmt = next((f for f, ext in self.SNAPSHOT_FORMATS.items() if tofile.endswith(ext)), fmt)
 
-		for c in items:
+		if fmt not in self.SNAPSHOT_FORMATS:
+			raise ValueError(f'unknown snapshot format {fmt}')
 
-			if ' ' + c + ' ' in ' ' + st.lower() + ' ':
-				found.add(c)
+		if fmt != 'csv':
+			try:
+				import pyarrow
+			except ImportError:
+				print(f'pyarrow is not available, saving as csv rather than {fmt}...')
+				if tofile and tofile.endswith(self.SNAPSHOT_FORMATS[fmt]):
+					tofile = tofile[:-len(self.SNAPSHOT_FORMATS[fmt])] + self.SNAPSHOT_FORMATS['csv']
+				fmt = 'csv'
 
-		return found
+		return tofile or f'events_{arrow.utcnow().to("Australia/Sydney").format(stamp)}{self.SNAPSHOT_FORMATS[fmt]}', fmt
 
-	def get_event_time(self, st):
+	def _read_manifest(self):
 		"""
-		find a time stamp in string st and see if it's morning, afternoon or evening
+		return saved snapshots as {file name: details}
 		"""
-		# we expect to have time stamps like '2013-05-05 12:30:45'
+		try:
+			return json.load(open(self.MANIFEST_FILE))
+		except:
+			return {}
 
-		weekdays = {i: d for i, d in zip([i for i in range(7)], 
-							['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday'])}
+	def _register_snapshot(self, file_, fmt, rows, columns):
+		"""
+		add snapshot file_ in NEWEVENT_DIR to the manifest; the manifest is replaced in one go
+		"""
+		manifest_ = self._read_manifest()
 
-		ts = arrow.get(st, 'YYYY-MM-DD HH:mm:ss')
-		hour = ts.hour
+		manifest_[file_] = {'format': fmt, 'rows': rows, 'columns': columns, 'saved': time.strftime('%Y-%m-%d %H:%M:%S')}
 
-		return (weekdays[ts.weekday()], 'morning' if (5 <= hour <= 11) else 
-					'afternoon' if (12 <= hour < 18) else 
-						'evening' if (18 <= hour < 21) else 'night')
+		with open(self.MANIFEST_FILE + '.tmp', 'w') as f:
+			json.dump(manifest_, f)
 
-	def find(self, st, what):
+		os.replace(self.MANIFEST_FILE + '.tmp', self.MANIFEST_FILE)
+
+	def from_snapshots(self, files=None, columns=None):
 		"""
-		find something that is available in an alphabetical dictionary in the string
+		collect events from snapshots saved earlier rather than from the database: every snapshot in the manifest
+		or just files. Only the primary key and columns (by default EVENT_COLUMNS) are read, feather and parquet files
+		are memory-mapped; an event in several snapshots is taken from the latest one
 		"""
+		import pandas as pd
 
-		assert what in self._NES, f'unfortunately, {what} is not supported'
+		manifest_ = self._read_manifest()
 
-		_s = self.normalize(st)
+		files_ = sorted(manifest_, key=lambda f: manifest_[f]['saved']) if files is None else list(files)
 
-		dk = self._NES[what]
+		for f in files_:
+			if f not in manifest_:
+				raise KeyError(f'{f} is not in the snapshot manifest {self.MANIFEST_FILE}')
 
-		if not _s:
-			return None
+		# the primary key always comes first as that's where everything downstream (e.g. _descriptions) expects it
+		columns_ = ['pk_event_dim'] + [c for c in (columns or self.EVENT_COLUMNS) if c != 'pk_event_dim']
+
+		frames_ = []
+
+		for f in files_:
 
-		found = set()
-		words = _s.split()
+			path_ = os.path.join(self.NEWEVENT_DIR, f)
+			use_ = [c for c in columns_ if c in manifest_[f]['columns']]
 
-		for i, w in enumerate(words):
+			if manifest_[f]['format'] == 'feather':
+				import pyarrow.feather
+				frames_.append(pyarrow.feather.read_table(path_, columns=use_, memory_map=True).to_pandas())
+			elif manifest_[f]['format'] == 'parquet':
+				import pyarrow.parquet
+				frames_.append(pyarrow.parquet.read_table(path_, columns=use_, memory_map=True).to_pandas())
+			else:
+				frames_.append(pd.read_csv(path_, sep='\t', usecols=use_, compression='gzip')[use_])
 
-			_l1 = w[0]
+		if not frames_:
+			self.events_ = pd.DataFrame(columns=columns_)
+		else:
+			self.events_ = pd.concat(frames_, ignore_index=True) \
+							.drop_duplicates('pk_event_dim', keep='last') \
+							.reset_index(drop=True)
 
-			if _l1.isalpha() and (_l1 in dk):
+		print(f'collected {len(self.events_):,} rows from {len(frames_)} snapshots')
 
-				_cands = {s for s in dk[_l1] if len(s.split()) <= len(words[i:])}
+		return self
+
+	def get_features(self, dedup=False):
+		"""
+		label collected events; with dedup=True near-duplicate events are labelled once per group
+		"""
+		self._ensure_dirs()
+
+		pks_processed = []
+		evs_processed = []
+		descr_processed = []
+		faulty_rows = set()
+
+		rows_ = list(self._descriptions(self.events_.iloc[:10000]))
+
+		if dedup:
+			# group on what the show is rather than when and where it's on
+			keys_ = self.normalize_series(self.events_.iloc[:10000][[c for c in self.events_.columns[1:] 
+						if c not in self.CLUSTER_IGNORE_COLUMNS]].astype(object).fillna('').astype(str).agg(' '.join, axis=1)).tolist()
+			ok_ = [len(r[1]) > 2 for r in rows_]
+			clustered_ = iter(self.label_clustered([r for r, o in zip(rows_, ok_) if o], [k for k, o in zip(keys_, ok_) if o]))
+
+		for i, (pk_, ds_, norm_) in enumerate(rows_,1):
+
+			if len(ds_) > 2:
+
+				e = next(clustered_) if dedup else self.label_event(pk_, ds_, norm_)
+			
+				pks_processed.append(pk_)
+				evs_processed.append(e.to_json())
+				descr_processed.append((pk_, ds_, norm_))
 
-				if _cands:
-					found.update(self.find_matches(_s, _cands))
 			else:
-				continue
 
-		return found if found else None
+				faulty_rows.add(pk_)
+
+			if i%100 == 0:
+				e.show()
+				print('faulty rows:', faulty_rows)
+		
+		self._track(pks_processed)
+		self._write_features(evs_processed, descr_processed, self._years(self.events_))
+		self._merge_features()
+
+		print(f'done. produced features for {len(pks_processed)} new event primary keys...')
 
-	def rank_artists(self, artist_list):
+	def _track(self, pks):
 		"""
-		which artist candidates on the list artist_list are more likely to be artist?
+		add primary keys pks to the list of processed events
 		"""
+		with open(self.OLDEVENT_FILE, 'a') as f:
+			for k in pks:
+				f.write(f'{k}\n')
 
-		MAX_ART = 3   # return up to 3 top ranked artists
+	def _read_features(self):
+		"""
+		return features saved so far as {event id: labels}
+		"""
+		try:
+			features_ = json.load(open(self.JSON_FILE))
+		except:
+			features_ = {}
 
-		bonuses = {'words_in_name': 0.5,    # per extra word
-						'uncommon_words_in_name': 1,   # multiplier
-							'popularity': 2,
-								'award_winner': 1,
-									'performed_in_australia': 0.5,
-										'possibly_dead': -1}   
+		# older runs saved a plain list of events
+		if isinstance(features_, list):
+			features_ = {str(ev['event_id']): ev for ev in features_}
 
+		if os.path.exists(self.FEATURES_LOG_FILE):
+			with open(self.FEATURES_LOG_FILE) as f:
+				for l in f:
+					# the last line may be half-written if a run died while appending
+					try:
+						ev = json.loads(l)
+					except ValueError:
+						continue
+					features_[str(ev['event_id'])] = ev
 
-		criteria = {'words_in_name': lambda x: bonuses['words_in_name']*(len(x.split()) - 1),
-					'uncommon_words_in_name': lambda x: bonuses['uncommon_words_in_name']*(1 - sum([(self.spell_checker.check(x) or self.spell_checker.check(x.title())) 
-															for w in x.split()])/len(x.split())),
-					'popularity': lambda x: bonuses['popularity'] if x in self._artists_popular.get(x[0], []) else 0,
-					'award_winner': lambda x: bonuses['award_winner'] if x in self._award_winners else 0,
-					'performed_in_australia': lambda x: bonuses['performed_in_australia'] if x in self._aus_gig_artists.get(x[0], []) else 0,
-					'possibly_dead': lambda x: bonuses['possibly_dead'] if x in self._dead_bands[x[0]] else 0}
+		return features_
+
+	def _years(self, events):
+		"""
+		return {primary key: year of performance} for events in a data frame
+		"""
+		import pandas as pd
 
-		scores_ = [a._replace(score=sum([a.words_in_name, a.uncommon_words_in_name, a.popularity, a.performed_in_australia,
-							a.possibly_dead]))
-						 for a in [Artist(name=a, **{c: criteria[c](a) for c in criteria}) for a in artist_list]]
+		if 'performance_time' not in events.columns:
+			return {}
 
-		return [_.name for _ in sorted(scores_, key=lambda x: x.score, reverse=True) if _.score > 0][:MAX_ART]
+		return {pk: int(y) for pk, y in zip(events['pk_event_dim'].tolist(), 
+						pd.to_datetime(events['performance_time'], errors='coerce').dt.year.tolist()) if y == y}
 
-	def rank_countries(self, countries):
+	def _write_features(self, evs_processed, descriptions=(), years=None):
 		"""
-		decide what countries in countries are worth keeping
+		add labelled events evs_processed to the features and the entity index and remember their descriptions
+		so that they can be relabelled when the dictionaries change; labels are appended to the features log 
+		rather than rewriting the whole features file every time, see _merge_features
 		"""
+		with self._features_lock():
 
-		if not isinstance(countries, list):
-			_ = list(countries)
-		else:
-			_ = countries
+			with open(self.FEATURES_LOG_FILE, 'a') as f:
+				for ev in evs_processed:
+					f.write(json.dumps(ev) + '\n')
 
-		list_out = [c for c in _ if (len(c) > 3) or (c in ['aus', 'nz', 'png', 'usa', 'us', 'uk'])]
+			index_ = EntityIndex(self.INDEX_FILE)
+			index_.add(evs_processed, years)
+			index_.close()
 
-		return list_out if list_out else None
+			if descriptions:
+				append_descriptions(self.DESCR_FILE, descriptions)
 
-	def find_teams(self, cands, s, m=None):
+			# the first time we label anything, note what the dictionaries looked like
+			if not os.path.exists(self.DICT_SNAPSHOT_FILE):
+				self._save_dictionary_snapshot(self._dicts)
+
+	@contextlib.contextmanager
+	def _features_lock(self):
+		"""
+		hold an exclusive lock on the features directory so that only one process at a time reads and rewrites
+		the features file and the entity index (a backfill can run in several processes); no locking where 
+		fcntl isn't available
 		"""
-		find what teams are mentioned in event description s; only up to 2 teams can be returned!
-		if need more, lift restrictions;
+		try:
+			import fcntl
+		except ImportError:
+			yield
+			return
+
+		with open(self.LOCK_FILE, 'a') as f:
+			fcntl.flock(f, fcntl.LOCK_EX)
+			try:
+				yield
+			finally:
+				fcntl.flock(f, fcntl.LOCK_UN)
 
-		note: RECURSION!
+	def _dump_features(self, features_):
 		"""
+		replace the features file with features_ in one go so that it's never seen half-written; whatever 
+		was in the features log is in features_ by now so the log goes. Call with the lock held
+		"""
+		tmp_ = f'{self.JSON_FILE}.{os.getpid()}.tmp'
 
-		max_words_in_team = len(max(cands, key=lambda _: len(_.split())).split())
-		words_in_string = len(s.split()) 
+		json.dump(features_, open(tmp_, 'w'))
+		os.replace(tmp_, self.JSON_FILE)
 
-		# set to store matched teams
-		if not m:
-			m = set()
+		try:
+			os.remove(self.FEATURES_LOG_FILE)
+		except FileNotFoundError:
+			pass
 
-		if (len(m) > 1) or (not max_words_in_team) or (not words_in_string) or (max_words_in_team > words_in_string):
-			return m
+	def _merge_features(self):
+		"""
+		rewrite the features file with everything in the features log; done once at the end of a run
+		"""
+		with self._features_lock():
+			if os.path.exists(self.FEATURES_LOG_FILE):
+				self._dump_features(self._read_features())
 
-		its = itertools.tee(iter(s.split()), max_words_in_team)
+	def _save_dictionary_snapshot(self, dicts):
 
-		# move some iterators ahead
-		for i, _ in enumerate(range(max_words_in_team)):
-			if i > 0:
-				for x in range(i):
-					next(its[i], None)  # i moves ahead by i - 1
-		
-		possible_matches = set()
-																
-		for p in zip(*its):
-			possible_matches.add(' '.join(p))
+		json.dump({what: sorted(entries) for what, entries in dictionary_entries(dicts).items()}, 
+					open(self.DICT_SNAPSHOT_FILE, 'w'))
 
-		cands_to_remove = set()
-		pms_to_remove = set()
-		
-		# vary levenshtein distance from 0 (exact match) to 2 
-		for lev in range(3):
-
-			for team in cands:
-
-				if not lev:
-
-					if team in possible_matches:
-						m.add(team)
-						
-						if len(m) > 1:
-							return m
-						
-						cands_to_remove.add(team)
-						pms_to_remove.add(team)
-						
-						# remove matched team from description
-						s = ' '.join(s.replace(team, ' ').split())
-				else:
+	def find_events(self, all_of=(), any_of=()):
+		"""
+		return sorted ids of labelled events that have all (entity type, entity) pairs in all_of and at least
+		one in any_of, e.g. find_events(all_of=[('music_venues', 'enmore theatre'), ('year', 2017)])
+		"""
+		if not os.path.exists(self.INDEX_FILE):
+			return []
 
-					for pm in possible_matches:
+		index_ = EntityIndex(self.INDEX_FILE)
+		ids_ = index_.query(all_of, any_of)
+		index_.close()
 
-						if jellyfish.levenshtein_distance(team,pm) == lev:
-							m.add(team)
-							
-							if len(m) > 1:
-								return m
+		return ids_
 
-							cands_to_remove.add(team)
-							pms_to_remove.add(pm)
+	def relabel_changed(self):
+		"""
+		compare the current dictionaries with the ones in use when events were last labelled and relabel 
+		only the events whose descriptions contain an added or removed entry
+		"""
+		self._ensure_dirs()
 
-			# remove detected candidates from list of candidates
-			# and do same for possible matches
-			cands = cands - cands_to_remove
-			possible_matches = possible_matches - pms_to_remove
+		d_ = self._dicts
 
-		# cover the case when some teams have long names and hence are often mentioned by a shortened name
-		if max_words_in_team > 1: 
-																
-			new_cands = set()
-																
-			for c in cands:
+		if not os.path.exists(self.DICT_SNAPSHOT_FILE):
+			self._save_dictionary_snapshot(d_)
+			print('no dictionary snapshot to compare with, saved the current one...')
+			return self
 
-				if len(c.split()) == max_words_in_team:
+		diff_ = diff_entries(json.load(open(self.DICT_SNAPSHOT_FILE)), dictionary_entries(d_))
 
-					if max_words_in_team == 2:
+		if not diff_:
+			print('dictionaries haven\'t changed, nothing to relabel...')
+			return self
 
-						for v in c.split():
-							if not self.spell_checker.check(v):
-								new_cands.add(v)
-					else:
+		for what, (added, removed) in diff_.items():
+			print(f'{what}: {len(added):,} added, {len(removed):,} removed')
 
-						for cm in itertools.combinations(c.split(), max_words_in_team - 1):
-							new_cands.add(' '.join(cm))
-						if max_words_in_team > 2:
-							new_cands.add(''.join([x[0] for x in c.split()]))
-			
-			cands = {c for c in cands if not len(c.split()) == max_words_in_team} | new_cands
+		with self._features_lock():
 
-			m.update(self.find_teams(cands, s, m))
-		
-		return m if m else None
+			index_ = DescriptionIndex(self.DESCR_FILE)
+			features_ = self._read_features()
+
+			affected_ = set()
+
+			for what, (added, removed) in diff_.items():
+
+				for e in added | removed:
+					affected_ |= index_.candidates(self.normalize(entry_name(e)))
+
+				# venue labels carry the postcodes of the venue's suburb
+				if what == 'suburb_locations':
+					subs_ = {entry_name(e) for e in added | removed}
+					for v, (sub, _) in d_.gazetteer.venues.items():
+						if sub in subs_:
+							affected_ |= index_.candidates(self.normalize(v))
+
+				# teams are also found by fuzzy matching at sport venues, so tokens aren't enough
+				if what == 'teams':
+					affected_ |= {k for k, ev in features_.items() if ev.get('sport_venues')}
+
+			affected_ &= set(index_.descriptions)
+
+			old_evs, new_evs = [], []
+
+			for k in affected_:
+				ds_, norm_ = index_.descriptions[k]
+				if k in features_:
+					old_evs.append(features_[k])
+				features_[k] = self.label_event(features_.get(k, {}).get('event_id', k), ds_, norm_, d_).to_json()
+				new_evs.append(features_[k])
 
+			self._dump_features(features_)
 
-	def get_labels(self, s):
+			entities_ = EntityIndex(self.INDEX_FILE)
+			entities_.remove(old_evs).add(new_evs)
+			entities_.close()
+
+			self._save_dictionary_snapshot(d_)
+
+		print(f'relabelled {len(affected_):,} out of {len(index_):,} events')
+
+		return self
+
+	def run_pipeline(self, batch_size=5000, queue_size=4, tofile=None, fmt='feather', compression='zstd'):
 		"""
-		extract all labels from description s
+		fetch, label and write new events at the same time: a fetch thread streams batches of batch_size rows 
+		from the database, a labelling thread labels them and a writer saves raw rows and labels; keys of a batch
+		are only marked as processed once its labels are written. Queues between the stages hold at most
+		queue_size batches so no stage runs too far ahead. Labelling is CPU-bound so there's a single labelling
+		thread, fetching and writing are what it overlaps with.
+
+		Raw rows go to a snapshot like the ones save() makes; every run gets its own snapshot which is only 
+		put in place and added to the manifest if the whole run succeeds
 		"""
+		import pandas as pd
 
-		labels_ = dict()
+		if not self.NEW_EVENT_PKS:
+			print('no new events today...')
+			return self
 
-		for what in self._NES:
+		self._ensure_dirs()
 
-			fnd_ = self.find(s, what)
+		if len(self.NEW_EVENT_PKS) < 10000:
+			q_ = f"""SELECT {",".join(self.EVENT_COLUMNS)} FROM {self.EVENT_TBL} WHERE pk_event_dim in ({', '.join(self.NEW_EVENT_PKS)});"""
+		else:
+			q_ = f"""SELECT {",".join(self.EVENT_COLUMNS)} FROM {self.EVENT_TBL};"""
 
-			if fnd_:
+		file_, fmt = self._snapshot_file(tofile, fmt, 'YYYYMMDD_HHmmss')
 
-				if what == 'artists':
-					fnd_ = self.rank_artists(fnd_)
-				elif what == 'countries':
-					fnd_ = self.rank_countries(fnd_)
+		snapshot_ = SnapshotWriter(os.path.join(self.NEWEVENT_DIR, file_), fmt, compression)
 
-				if fnd_:
-					labels_.update({what: fnd_})
+		fetched_q = queue.Queue(maxsize=queue_size)
+		labelled_q = queue.Queue(maxsize=queue_size)
 
-		return labels_
+		stop_ = threading.Event()
+		errors_ = []
+		DONE = object()
 
-	def get_features(self):
+		def _put(q, item):
+			while not stop_.is_set():
+				try:
+					q.put(item, timeout=1)
+					return
+				except queue.Full:
+					continue
 
-		# column names to be parts of description
-		descr_cols = list(self.events_.columns[1:])
-		
-		pks_processed = []
-		evs_processed = []
-		faulty_rows = set()
+		def _get(q):
+			while not stop_.is_set():
+				try:
+					return q.get(timeout=1)
+				except queue.Empty:
+					continue
+			return DONE
 
-		for i, event in enumerate(self.events_.iloc[:10000].iterrows(),1):
+		def _fetch():
+			try:
+				for chunk in pd.read_sql(q_, self._ENGINE, chunksize=batch_size):
+					# another stage has failed, no point reading the rest of the table
+					if stop_.is_set():
+						break
+					if len(self.NEW_EVENT_PKS) >= 10000:
+						chunk = chunk[chunk['pk_event_dim'].astype(str).isin(self.NEW_EVENT_PKS)]
+					if len(chunk):
+						_put(fetched_q, chunk)
+			except Exception as e:
+				errors_.append(e)
+				stop_.set()
+			finally:
+				_put(fetched_q, DONE)
+
+		def _label():
+			try:
+				while True:
+					chunk = _get(fetched_q)
+					if chunk is DONE:
+						break
+					pks_processed, evs_processed, descr_processed = [], [], []
+					for pk_, ds_, norm_ in self._descriptions(chunk):
+						if len(ds_) > 2:
+							pks_processed.append(pk_)
+							evs_processed.append(self.label_event(pk_, ds_, norm_).to_json())
+							descr_processed.append((pk_, ds_, norm_))
+					_put(labelled_q, (chunk, pks_processed, evs_processed, descr_processed))
+			except Exception as e:
+				errors_.append(e)
+				stop_.set()
+			finally:
+				_put(labelled_q, DONE)
+
+		labelled_ = 0
+
+		def _write():
+			nonlocal labelled_
+			try:
+				while True:
+					item = _get(labelled_q)
+					if item is DONE:
+						break
+					chunk, pks_processed, evs_processed, descr_processed = item
+					snapshot_.write(chunk)
+					# if anything fails from here on these keys stay new and are labelled again next time
+					self._write_features(evs_processed, descr_processed, self._years(chunk))
+					self._track(pks_processed)
+					labelled_ += len(pks_processed)
+			except Exception as e:
+				errors_.append(e)
+				stop_.set()
+
+		threads_ = [threading.Thread(target=_fetch, name='fetch'), 
+					threading.Thread(target=_label, name='label'), 
+					threading.Thread(target=_write, name='write')]
+
+		for t in threads_:
+			t.start()
+		for t in threads_:
+			t.join()
+
+		if errors_:
+			snapshot_.abort()
+			raise errors_[0]
+
+		if snapshot_.close():
+			self._register_snapshot(file_, fmt, snapshot_.rows, snapshot_.columns)
+
+		self._merge_features()
+
+		print(f'done. saved {snapshot_.rows:,} rows to {file_} and produced features for {labelled_:,} new event primary keys...')
 
-			pk_ = event[1]['pk_event_dim']
-			ds_ = ' '.join([str(event[1][c]) for c in descr_cols]).strip()
+		return self
 
-			if len(ds_) > 2:
+	def _claim_file(self, start, end):
+
+		return os.path.join(self.BACKFILL_DIR, f'range_{start:012d}_{end:012d}.claim')
+
+	@staticmethod
+	def _read_claim(claim_):
+		"""
+		return what's in claim file claim_ as a dictionary or None if it's gone; claims that can't be 
+		read (e.g. in the old format) come back empty
+		"""
+		try:
+			return json.load(open(claim_))
+		except FileNotFoundError:
+			return None
+		except ValueError:
+			return {}
 
-				e = Event(event_id=pk_, description=ds_)
+	def _claim_abandoned(self, claim_, owner, reclaim_after):
+		"""
+		decide if a claim with owner (as returned by _read_claim) can be taken over: its process is dead 
+		or it hasn't had a heartbeat for reclaim_after seconds
+		"""
+		try:
+			if time.time() - os.path.getmtime(claim_) > reclaim_after:
+				return True
+		except FileNotFoundError:
+			return False
 
-				e._labels = self.get_labels(e.description)
+		if owner.get('host') == socket.gethostname():
+			try:
+				os.kill(owner['pid'], 0)
+			except ProcessLookupError:
+				return True
+			except (PermissionError, KeyError, TypeError):
+				pass
 
-				e.get_type()
+		return False
 
-				if e._labels.get('sport_venues', None) and (len(e._labels.get('teams', [])) < 2):
-					e._labels['teams'] = self.find_teams(self._team_names_only, e.description)
+	def _claim_range(self, start, end, reclaim_after):
+		"""
+		try to claim primary key range [start, end) for this process; return the claim token if we got it or None
+		"""
+		claim_ = self._claim_file(start, end)
 
-			
-				pks_processed.append(event[1]['pk_event_dim'])
-				evs_processed.append(e.to_json())
+		owner_ = self._read_claim(claim_)
 
-			else:
+		if (owner_ is not None) and self._claim_abandoned(claim_, owner_, reclaim_after):
 
-				faulty_rows.add(event[1])
+			# move the claim out of the way under a name only we use; if what we moved isn't the claim we 
+			# decided was abandoned, somebody else has just taken the range over so we put theirs back
+			moved_ = f'{claim_}.takeover.{uuid.uuid4().hex}'
 
-			if i%100 == 0:
-				e.show()
-				print('faulty rows:', faulty_rows)
-		
-		with open(self.OLDEVENT_FILE, 'a') as f:
-			for k in pks_processed:
-				f.write(f'{k}\n')
+			try:
+				os.rename(claim_, moved_)
+			except OSError:
+				return None
+
+			if self._read_claim(moved_) != owner_:
+				try:
+					os.link(moved_, claim_)
+				except OSError:
+					pass
+				os.remove(moved_)
+				return None
+
+			os.remove(moved_)
 
 		try:
-			evs_processed = {**evs_processed, **json.load(open(self.JSON_FILE))}
-		except:
+			fd = os.open(claim_, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+		except FileExistsError:
+			return None
+
+		token_ = uuid.uuid4().hex
+
+		with os.fdopen(fd, 'w') as f:
+			json.dump({'host': socket.gethostname(), 'pid': os.getpid(), 'token': token_, 'claimed': time.time()}, f)
+
+		return token_
+
+	def _heartbeat(self, claim_, every):
+		"""
+		keep touching claim file claim_ every EVERY seconds in a background thread so that it doesn't look
+		abandoned while we're working on it; set the returned event to stop
+		"""
+		stop_ = threading.Event()
+
+		def _beat():
+			while not stop_.wait(every):
+				try:
+					os.utime(claim_)
+				except OSError:
+					pass
+
+		threading.Thread(target=_beat, name='claim-heartbeat', daemon=True).start()
+
+		return stop_
+
+	def _commit_range(self, start, end, pks):
+		"""
+		mark range [start, end) with labelled primary keys pks as done; the range counts as done only 
+		once the file is in place
+		"""
+		file_ = os.path.join(self.BACKFILL_DIR, f'range_{start:012d}_{end:012d}.json')
+
+		with open(file_ + '.tmp', 'w') as f:
+			json.dump({'pks': [str(k) for k in pks]}, f)
+			f.flush()
+			os.fsync(f.fileno())
+
+		os.replace(file_ + '.tmp', file_)
+
+		try:
+			os.remove(self._claim_file(start, end))
+		except FileNotFoundError:
 			pass
 
-		json.dump(evs_processed, open(self.JSON_FILE,'w'))
+	def backfilled_pks(self):
+		"""
+		return primary keys of all events labelled by committed backfill ranges
+		"""
+		pks_ = set()
 
-		print(f'done. produced features for {len(pks_processed)} new event primary keys...')
+		if os.path.isdir(self.BACKFILL_DIR):
+			for f in os.listdir(self.BACKFILL_DIR):
+				if f.startswith('range_') and f.endswith('.json'):
+					pks_.update(json.load(open(os.path.join(self.BACKFILL_DIR, f)))['pks'])
+
+		return pks_
+
+	def _backfill_range(self, start, end):
+		"""
+		label events with primary keys in [start, end), merge their labels into the features file, entity index 
+		and descriptions and commit the range; return how many were labelled
+		"""
+		import pandas as pd
+
+		events = pd.read_sql(f"""
+							SELECT {",".join(self.EVENT_COLUMNS)}
+							FROM {self.EVENT_TBL} WHERE pk_event_dim >= {start} AND pk_event_dim < {end}
+							ORDER BY pk_event_dim;
+							""", self._ENGINE)
+
+		pks_processed, evs_processed, descr_processed = [], [], []
+
+		for pk_, ds_, norm_ in self._descriptions(events):
+			if len(ds_) > 2:
+				pks_processed.append(pk_)
+				evs_processed.append(self.label_event(pk_, ds_, norm_).to_json())
+				descr_processed.append((pk_, ds_, norm_))
+
+		# labels go where everything else looks for them first; if we fail before the range is committed
+		# it's labelled again and the labels replace these
+		self._write_features(evs_processed, descr_processed, self._years(events))
+		self._commit_range(start, end, pks_processed)
+
+		return len(pks_processed)
+
+	def _check_chunk_size(self, chunk_size):
+		"""
+		note chunk_size if this is the first backfill or make sure it's the one the committed ranges were made 
+		with; ranges of a different size would overlap them
+		"""
+		tmp_ = f'{self.BACKFILL_SETTINGS_FILE}.{os.getpid()}.tmp'
+
+		json.dump({'chunk_size': chunk_size}, open(tmp_, 'w'))
+
+		# linking fails if the file is already there so only the first backfill gets to write it
+		try:
+			os.link(tmp_, self.BACKFILL_SETTINGS_FILE)
+		except FileExistsError:
+			pass
+		finally:
+			os.remove(tmp_)
+
+		used_ = json.load(open(self.BACKFILL_SETTINGS_FILE))['chunk_size']
+
+		if used_ != chunk_size:
+			raise ValueError(f'backfill in {self.BACKFILL_DIR} uses chunk_size={used_:,}, can\'t continue it with {chunk_size:,}')
+
+	def backfill(self, chunk_size=50000, reclaim_after=3600):
+		"""
+		label the whole event table in ordered primary key ranges of size chunk_size (starting at multiples of 
+		chunk_size, which can't change once a backfill has started); every range is committed as soon as it's done so a backfill that's been interrupted resumes from where it stopped.
+		Several processes can backfill at the same time, each range is claimed by one process only. Claims 
+		get a heartbeat while their range is being labelled; a claim without one for reclaim_after seconds
+		or whose process is dead (if it's on the same host) is taken over
+		"""
+		self._ensure_dirs()
+
+		if not os.path.exists(self.BACKFILL_DIR):
+			os.mkdir(self.BACKFILL_DIR)
+
+		self._check_chunk_size(chunk_size)
+
+		min_pk, max_pk = self.sess.execute(f'SELECT MIN(pk_event_dim), MAX(pk_event_dim) FROM {self.EVENT_TBL};').fetchone()
+
+		if min_pk is None:
+			print('nothing to backfill...')
+			return self
+
+		# ranges start at multiples of chunk_size so that they stay the same whatever the smallest key is
+		starts_ = range((int(min_pk)//chunk_size)*chunk_size, int(max_pk) + 1, chunk_size)
+
+		done_ = {f for f in os.listdir(self.BACKFILL_DIR) if f.startswith('range_') and f.endswith('.json')}
+
+		for start in starts_:
+
+			end = start + chunk_size
+
+			if (f'range_{start:012d}_{end:012d}.json' in done_) or (not self._claim_range(start, end, reclaim_after)):
+				continue
+
+			# somebody may have committed this range between our listing and the claim
+			if os.path.exists(os.path.join(self.BACKFILL_DIR, f'range_{start:012d}_{end:012d}.json')):
+				os.remove(self._claim_file(start, end))
+				continue
+
+			heartbeat_ = self._heartbeat(self._claim_file(start, end), max(reclaim_after/4, 1))
+
+			try:
+				n_ = self._backfill_range(start, end)
+			except:
+				# give the range back so that it can be picked up again straight away
+				try:
+					os.remove(self._claim_file(start, end))
+				except OSError:
+					pass
+				raise
+			finally:
+				heartbeat_.set()
+
+			print(f'backfilled range {start:,}-{end:,}: {n_:,} events')
+
+		self._merge_features()
+
+		done_ = {f for f in os.listdir(self.BACKFILL_DIR) if f.startswith('range_') and f.endswith('.json')}
+
+		unfinished_ = [(start, start + chunk_size) for start in starts_
+							if f'range_{start:012d}_{start + chunk_size:012d}.json' not in done_]
+
+		if unfinished_:
+			print(f'{len(unfinished_):,} ranges are not finished yet, claimed by other processes: ' 
+					+ ', '.join(f'{s_:,}-{e_:,}' for s_, e_ in unfinished_))
+
+		return self
 
 if __name__ == '__main__':
 
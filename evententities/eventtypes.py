@@ -0,0 +1,82 @@
+from typing import NamedTuple, Callable
+
+class Rule(NamedTuple):
+
+	type: str
+	# predicate takes (labels, label names, words in description, normalized description)
+	predicate: Callable
+	# if False, the predicate never looks at the description so we don't have to split it
+	uses_text: bool=False
+
+
+CONCERT_WORDS = frozenset({'guest', 'featuring', 'feat', 'with', 'headline', 'presents', 'vinyl', 'cd', 'tour'})
+SPECIAL_INTEREST = frozenset({'boxers', 'psychics', 'life_coaches', 'motivational_speakers'})
+CONCERT_MIN_LABELS = frozenset({'artists', 'promoters'})
+SPORT_MIN_LABELS = frozenset({'sport_venues', 'sport_names'})
+
+# the order matters: the first rule that fires decides the type; several rules may lead to the same type
+DEFAULT_RULES = [Rule('concert', lambda labs, names, words, descr: CONCERT_MIN_LABELS < names),
+				 Rule('concert', lambda labs, names, words, descr: ('artists' in names) and bool(CONCERT_WORDS & words), True),
+				 Rule('concert', lambda labs, names, words, descr: 'doors open' in descr, True),
+				 Rule('special interest', lambda labs, names, words, descr: bool(SPECIAL_INTEREST & names)),
+				 Rule('sport', lambda labs, names, words, descr: len(labs.get('teams') or []) == 2),
+				 Rule('sport', lambda labs, names, words, descr: SPORT_MIN_LABELS < names),
+				 Rule('circus', lambda labs, names, words, descr: 'circuses' in names)]
+
+
+class EventTypeClassifier:
+
+	"""
+	decide an event's entertainment type by going through an ordered table of rules;
+	evaluation stops at the first rule that fires
+	"""
+	def __init__(self, rules=None):
+
+		self.rules = list(DEFAULT_RULES if rules is None else rules)
+
+	def add_rule(self, type_, predicate, uses_text=False, before=None):
+		"""
+		add a rule for type type_; it goes to the end of the table unless before is given,
+		in which case it is placed right before the first rule for type before
+		"""
+		rule = Rule(type_, predicate, uses_text)
+
+		if before is None:
+			self.rules.append(rule)
+		else:
+			i = next((i for i, r in enumerate(self.rules) if r.type == before), len(self.rules))
+			self.rules.insert(i, rule)
+
+		return self
+
+	def classify(self, labels, description):
+		"""
+		return the type of an event with labels labels and description description
+		(or None if no rule fires); description may be a string or a sequence of tokens
+		"""
+		names = set(labels)
+		words = descr = None
+
+		for tp, predicate, uses_text in self.rules:
+
+			if uses_text and (descr is None):
+				tokens = description.lower().split() if isinstance(description, str) else [t.lower() for t in description]
+				words = set(tokens)
+				descr = ' '.join(tokens)
+
+			if predicate(labels, names, words, descr):
+				return tp
+
+		return None
+
+	def classify_batch(self, labels, descriptions):
+		"""
+		return a list of types for the label sets in labels and the matching descriptions (or token lists)
+		in descriptions
+		"""
+		classify = self.classify
+
+		return [classify(labs, descr) for labs, descr in zip(labels, descriptions)]
+
+
+classifier = EventTypeClassifier()
@@ -0,0 +1,97 @@
+from collections import defaultdict
+from vocabulary import EntryIndex
+
+class Gazetteer:
+
+	"""
+	one index for suburbs, music venues and state names so that a single pass over an encoded
+	description finds all of them; matched suburbs and venues can then be resolved to states and postcodes
+	"""
+	def __init__(self, vocab, suburbs, venues, venue_locations, states):
+
+		# suburbs look like {letter: {suburb: [{state: .., postcode: ..}, ..]}}; keep (state, postcodes) tuples only
+		self.suburbs = {}
+
+		for l in suburbs:
+			for sub in suburbs[l]:
+				by_state = defaultdict(list)
+				for r in suburbs[l][sub]:
+					by_state[r['state']].append(str(r['postcode']))
+				self.suburbs[sub] = tuple((st, tuple(sorted(pcs))) for st, pcs in by_state.items())
+
+		# venue locations look like {letter: [{name: .., location: 'newtown, nsw, australia'}, ..]}
+		self.venues = {}
+
+		for l in venue_locations:
+			for v in venue_locations[l]:
+				sub, st, *_ = [_.strip() for _ in v['location'].split(',')] + ['', '']
+				self.venues[v['name']] = (sub, st)
+
+		# states is {abbreviation: full name}; descriptions are normalized so only full names are left there
+		self.states = {full: ab for ab, full in states.items()}
+
+		# every name with what kind(s) of place it is; a suburb can also be the name of a venue or a state
+		self.kinds = defaultdict(set)
+
+		for kind, names in [('suburbs', self.suburbs), ('music_venues', (e for l in venues for e in venues[l])), 
+								('states', self.states)]:
+			for n in names:
+				self.kinds[n].add(kind)
+
+		# lookup goes through all names at once, the ones by kind are there to look for a single kind (see find)
+		self._all = EntryIndex(vocab, self.kinds)
+
+		self.index = {kind: EntryIndex(vocab, [n for n in self.kinds if kind in self.kinds[n]]) 
+						for kind in ['suburbs', 'music_venues', 'states']}
+
+	def lookup(self, ids):
+		"""
+		return matched suburbs, venues and state abbreviations in the encoded description ids
+		"""
+		found = {k: set() for k in self.index}
+
+		for n in self._all.match(ids):
+			for kind in self.kinds[n]:
+				found[kind].add(n)
+
+		found['states'] = {self.states[s] for s in found['states']}
+
+		return found
+
+	def _postcodes(self, sub, state):
+
+		return next((pcs for st, pcs in self.suburbs.get(sub, ()) if st == state), ())
+
+	def resolve(self, suburbs, venues=(), states=()):
+		"""
+		return location labels for matched suburbs and venues; states mentioned in the description
+		(or the state where the matched venues are if they agree on one) decide between suburbs with the same 
+		name in different states. A venue whose name is part of the name of another matched venue is dropped
+		as it's only been found inside the longer one
+		"""
+		venues = [v for v in venues if not any((w != v) and (f' {v} ' in f' {w} ') for w in venues)]
+
+		venue_labels = []
+		venue_states = set()
+
+		for v in sorted(venues):
+
+			if v in self.venues:
+				sub, st = self.venues[v]
+				venue_states.add(st)
+				venue_labels.append(', '.join([v, sub, st, '/'.join(self._postcodes(sub, st))]).rstrip(', '))
+
+		known_states = set(states) or (venue_states if len(venue_states) == 1 else set())
+
+		suburb_labels = []
+
+		for sub in sorted(suburbs):
+
+			recs = self.suburbs.get(sub, ())
+
+			if (len(recs) > 1) and known_states:
+				recs = tuple(r for r in recs if r[0] in known_states) or recs
+
+			suburb_labels.extend([f'{sub}, {st}, {"/".join(pcs)}' for st, pcs in recs])
+
+		return suburb_labels, venue_labels
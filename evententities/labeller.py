@@ -0,0 +1,952 @@
+from collections import defaultdict
+from weakref import WeakKeyDictionary
+import json
+import os
+import threading
+import itertools
+from typing import NamedTuple
+
+from artistnormaliser import ArtistNameNormaliser
+from eventtypes import classifier
+from vocabulary import Vocabulary, EntryIndex, ngrams
+from gazetteer import Gazetteer
+
+# pandas, enchant, jellyfish, arrow and numpy (via dedup) are only imported when first needed so that
+# importing the labeller stays cheap for workers and command line tools that only match text
+
+class Artist(NamedTuple):
+
+	name: str
+	words_in_name: float
+	uncommon_words_in_name: float
+	popularity: float
+	award_winner: float
+	performed_in_australia: float
+	possibly_dead: float
+	score: float=0
+
+
+class String:
+
+	"""
+	descriptor that requires property to be a string; for explanation of descriptors
+	see http://nbviewer.jupyter.org/urls/gist.github.com/ChrisBeaumont/5758381/raw/descriptor_writeup.ipynb
+	"""
+
+	def __init__(self, value_default):
+
+		# value_default is the default value any String instance will be initialized with; 
+		# it could be None or something else
+
+		self.value = value_default
+		self.data = WeakKeyDictionary()
+
+	def __get__(self, instance, owner):
+
+		# instance is the instance (say, x) that calls get on an String-instance property d: like x.d
+		# owner: this is effectively the Event class that "owns" this descriptor (because descriptor
+		# instances will have to be **class** variables)
+
+		return self.data.get(instance, self.value)
+
+	def __set__(self, instance, value):
+
+		if not isinstance(value, str):
+			self.data[instance] = None
+		else:
+			self.data[instance] = value
+
+class _EventBase:
+	"""
+	behaviour shared by all event representations; subclasses only decide how the attributes are stored
+	"""
+	__slots__ = ()
+
+	@property
+	def ev_id(self):
+		return self._ev_id
+
+	@ev_id.setter
+	def ev_id(self, value):
+		if isinstance(value, int):
+			self._ev_id = value
+
+	@property
+	def timestamp(self):
+		return self._timestamp
+
+	@timestamp.setter
+	def timestamp(self, value):
+		if isinstance(value, str):
+			self._timestamp = value
+
+	def show(self):
+
+		labels_ = self._labels
+
+		print()
+		print(f'ID:')
+		print(f'{" ":>18}{self._ev_id}')
+		print(f'DESCRIPTION:')
+		print(f'{" ":>18}{self.description}')
+		print('LABELS:')
+		print()
+		for lab in labels_:
+			print(f'{lab:>16}: {", ".join(labels_[lab])}')
+		print()
+		print(f'ENTERTAINMENT TYPE: {self.entertainment}')
+		print()
+
+	def get_type(self):
+		"""
+		decide what event type it is based on labels
+		"""
+		tp = classifier.classify(self._labels, self.description)
+
+		if tp:
+			self.entertainment = tp
+
+		return self
+
+	def to_json(self):
+
+		return {**{'event_id': self._ev_id, 'type': self.entertainment}, **{l: list(self._labels[l]) for l in self._labels}}
+
+
+class Event(_EventBase):
+	"""
+	representation of a basic event
+	"""
+	description = String('')
+	entertainment_type = String('')
+
+	def __init__(self, event_id, timestamp=None, description=None, entertainment_type=None):
+
+		# event id comes from an event table, it's a label we assign and do nothing with
+		self._ev_id = event_id
+		self._timestamp = timestamp
+		# description is a string containing basic info about an event
+		self.description = description
+		# entertainment_type is a high-level event type like sports or music or something
+		self.entertainment = entertainment_type
+		# every event instance will have its features (labels)
+		self._labels = defaultdict()
+
+
+class SlimEvent(_EventBase):
+	"""
+	same as Event but without a per-instance __dict__ and descriptor lookups; use this one
+	when labelling large numbers of events
+	"""
+	__slots__ = ('_ev_id', '_timestamp', '_description', 'entertainment', '_labels')
+
+	def __init__(self, event_id, timestamp=None, description=None, entertainment_type=None):
+
+		self._ev_id = event_id
+		self._timestamp = timestamp
+		self.description = description
+		self.entertainment = entertainment_type
+		self._labels = {}
+
+	@property
+	def description(self):
+		return self._description
+
+	@description.setter
+	def description(self, value):
+		# same rule as the String descriptor: anything that's not a string becomes None
+		self._description = value if isinstance(value, str) else None
+
+
+class EventBatch:
+	"""
+	struct-of-arrays storage for many events: one list per attribute instead of one object per event
+	"""
+	__slots__ = ('ev_ids', 'timestamps', 'descriptions', 'labels', 'types')
+
+	def __init__(self):
+
+		self.ev_ids = []
+		self.timestamps = []
+		self.descriptions = []
+		self.labels = []
+		self.types = []
+
+	def __len__(self):
+		return len(self.ev_ids)
+
+	def append(self, event_id, timestamp=None, description=None, entertainment_type=None, labels=None):
+		"""
+		add an event; arguments are in the same order as for Event and SlimEvent, with its labels last
+		"""
+		self.ev_ids.append(event_id)
+		self.timestamps.append(timestamp)
+		self.descriptions.append(description if isinstance(description, str) else None)
+		self.labels.append(labels if labels is not None else {})
+		self.types.append(entertainment_type)
+
+		return self
+
+	def event(self, i):
+		"""
+		return event number i as a SlimEvent; labels are shared, not copied
+		"""
+		e = SlimEvent(event_id=self.ev_ids[i], timestamp=self.timestamps[i], 
+						description=self.descriptions[i], entertainment_type=self.types[i])
+		e._labels = self.labels[i]
+
+		return e
+
+	def get_types(self):
+		"""
+		decide event types for all events in the batch
+		"""
+		for i, tp in enumerate(classifier.classify_batch(self.labels, self.descriptions)):
+			if tp:
+				self.types[i] = tp
+
+		return self
+
+	def to_json(self):
+
+		return [{**{'event_id': ev_id, 'type': tp}, **{l: list(labs[l]) for l in labs}} 
+					for ev_id, tp, labs in zip(self.ev_ids, self.types, self.labels)]
+	
+
+class EntityDictionaries:
+	"""
+	snapshot of all entity dictionaries along with everything built from them
+	"""
+	__slots__ = ('signature', 'nes', 'index', 'vocab', 'gazetteer', 'team_names_only', 
+					'dead_bands', 'award_winners', 'artists_popular', 'aus_gig_artists')
+
+	def __init__(self, **kwargs):
+
+		for k in self.__slots__:
+			setattr(self, k, kwargs.get(k))
+
+
+class EventLabeller(ArtistNameNormaliser):
+
+	"""
+	labelling core: entity dictionaries and everything needed to label event descriptions; knows nothing
+	about databases or where the labels end up
+	"""
+	# labels that are looked for again in every near-duplicate event instead of being copied
+	CLUSTER_FIELDS = ('suburbs', 'music_venues', 'sport_venues', 'venue_types')
+	# what entity types to look for in which event table columns when descriptions come by column; '*' stands
+	# for every type that isn't named anywhere here. Columns that aren't here (like performance_time) are never matched
+	FIELD_ROUTES = {'primary_show_desc': ('*', 'artists'),
+					'title_who': ('*', 'artists'),
+					'title_where': ('suburbs', 'music_venues', 'sport_venues', 'venue_types'),
+					'title1': ('*',),
+					'title2': ('*',),
+					'title3': ('*',),
+					'title4': ('*',),
+					'title5': ('*',),
+					'title6': ('*',)}
+
+	def __init__(self, data_dir=None, field_routes=None):
+
+		self.DATA_DIR = data_dir or os.path.join(os.path.curdir, 'data')
+
+		self.GEO_DIR = os.path.join(self.DATA_DIR, 'geo')
+		self.SPORTS_DIR = os.path.join(self.DATA_DIR,'sports')
+		self.MUSIC_DIR = os.path.join(self.DATA_DIR, 'music')
+		self.MUSICAL_DIR = os.path.join(self.DATA_DIR, 'musical')
+		self.OPERA_DIR = os.path.join(self.DATA_DIR, 'opera')
+		self.COMEDY_DIR = os.path.join(self.DATA_DIR, 'comedy')
+		self.CIRCUS_DIR = os.path.join(self.DATA_DIR, 'circus')
+		self.SPECIAL_DIR = os.path.join(self.DATA_DIR, 'special')
+		self.COMPANY_DIR = os.path.join(self.DATA_DIR, 'companies')
+		self.MOVIE_DIR = os.path.join(self.DATA_DIR, 'movie')
+		self.FESTIVAL_DIR = os.path.join(self.DATA_DIR, 'festivals')
+		self.MISC_DIR = os.path.join(self.DATA_DIR, 'misc')
+
+		# spell checker and near-duplicate detection are set up on first use
+		self._spell_checker = None
+		self._lsh = None
+
+		# all dictionaries live in a single snapshot; reloading replaces the whole snapshot at once
+		self._dicts = self._load_dictionaries()
+
+		if field_routes is not None:
+			self.FIELD_ROUTES = field_routes
+
+		self._all_types = frozenset(self._dicts.nes)
+		self._routes = self._resolve_routes(self.FIELD_ROUTES)
+
+		self._reloader = None
+		self._reloader_stop = threading.Event()
+
+	@property
+	def spell_checker(self):
+
+		if self._spell_checker is None:
+			import enchant
+			self._spell_checker = enchant.Dict("en_US")
+
+		return self._spell_checker
+
+	def _resolve_routes(self, routes):
+		"""
+		turn {column: entity types} with '*' for every type not named anywhere else into {column: set of types}
+		"""
+		named_ = {w for ts in routes.values() for w in ts if w != '*'}
+
+		if named_ - self._all_types:
+			raise ValueError(f'unknown entity types in field routes: {", ".join(sorted(named_ - self._all_types))}')
+
+		return {c: frozenset(w for w in ts if w != '*') | (self._all_types - named_ if '*' in ts else frozenset()) 
+					for c, ts in routes.items()}
+
+	def _dictionary_signature(self):
+		"""
+		return something that changes whenever any of the dictionary files changes
+		"""
+		sig_ = []
+
+		for root, dirs, files in os.walk(self.DATA_DIR):
+			for f in files:
+				if f.endswith('.json'):
+					st_ = os.stat(os.path.join(root, f))
+					sig_.append((os.path.relpath(os.path.join(root, f), self.DATA_DIR), st_.st_mtime_ns, st_.st_size))
+
+		return tuple(sorted(sig_))
+
+	def _load_dictionaries(self, signature=None):
+		"""
+		load all entity dictionaries and build the indexes; nothing on self is touched
+		so this can run in the background while other threads are labelling
+		"""
+		if signature is None:
+			signature = self._dictionary_signature()
+
+		# geo
+
+		countries, suburbs = [json.load(open(os.path.join(self.GEO_DIR, f + '.json'))) 
+			for f in ['countries', 'suburbs']]
+
+		# sports
+
+		teams, sport_names, tournaments, \
+			tournament_types, sponsors, sport_venues = \
+				[json.load(open(os.path.join(self.SPORTS_DIR, f + '.json'))) 
+			for f in ['teams', 
+						'sport-names', 
+							'tournaments',
+								'tournament-types',
+									'sponsors',
+										'sport-venues']]
+
+		# unlike the other dictionaries sponsors.json isn't split by first letter but is {sponsor: sports}; 
+		# put it in the same shape so that it's the sponsor names that get indexed rather than their sports
+		sponsors = self._by_first_letter(sponsors)
+
+		# music
+
+		promoters = json.load(open(os.path.join(self.MUSIC_DIR, 'data_promoters.json')))
+		music_venues = json.load(open(os.path.join(self.MUSIC_DIR, 'data_music-venues.json')))
+		venue_locations = json.load(open(os.path.join(self.MUSIC_DIR, 'music-venues.json')))
+
+		artists = json.load(open(os.path.join(self.MUSIC_DIR, 'data_artists.json')))
+		major_music_genres = json.load(open(os.path.join(self.MUSIC_DIR, 'data_major-music-genres.json')))
+
+		# musicals, opera, comedy and circus
+
+		musicals = json.load(open(os.path.join(self.MUSICAL_DIR, 'musicals.json')))
+		opera_singers = json.load(open(os.path.join(self.OPERA_DIR, 'singers.json')))
+		comedians = json.load(open(os.path.join(self.COMEDY_DIR, 'comedians.json')))
+		circuses = json.load(open(os.path.join(self.CIRCUS_DIR, 'circus.json')))
+
+		# special interests
+
+		life_coaches, boxers, psychics, motivational_speakers = [json.load(open(os.path.join(self.SPECIAL_DIR, f + '.json'))) 
+												for f in ['life_coaches', 'boxers', 'psychics', 'motivational_speakers']]
+
+		companies = json.load(open(os.path.join(self.COMPANY_DIR, 'companies.json')))
+
+		movies = json.load(open(os.path.join(self.MOVIE_DIR, 'movies.json')))
+
+		festivals = self._normalize_dict(json.load(open(os.path.join(self.FESTIVAL_DIR, 'festivals.json'))))
+
+		purchase_types = json.load(open(os.path.join(self.MISC_DIR, 'data_purchase-types.json')))
+		venue_types = json.load(open(os.path.join(self.MISC_DIR, 'data_venue-types.json')))
+
+		nes = {'suburbs': suburbs, 
+			   'musicals': musicals, 
+			   'artists': artists, 
+			   'movies': movies,
+			   'promoters': promoters, 
+			   'opera_singers': opera_singers,
+			   'countries': countries, 
+			   'companies': companies,
+			   'teams': teams,
+			   'sport_names': sport_names, 
+			   'venue_types': venue_types,
+			   'sport_venues': sport_venues,
+			   'major_music_genres': major_music_genres, 
+			   'music_venues': music_venues,
+			   'festivals': festivals,
+			   'tournament_types': tournament_types,
+			   'tournaments': tournaments, 
+			   'sponsors': sponsors,
+			   'purchase_types': purchase_types, 
+			   'comedians': comedians,
+			   'life_coaches': life_coaches,
+			   'boxers': boxers,
+			   'psychics': psychics,
+			   'circuses': circuses,
+			   'motivational_speakers': motivational_speakers}
+
+		# all entries become int sequences sharing one vocabulary with the descriptions; every dictionary is
+		# {letter: entries} where entries is a list or a dictionary of entries with their details, so it's 
+		# entry names (the keys of such dictionaries) that are indexed, never the details
+
+		vocab = Vocabulary()
+
+		# suburbs and music venues are indexed by the gazetteer which also knows where they are
+		gazetteer = Gazetteer(vocab, suburbs, music_venues, venue_locations, 
+								{ab: self.ABBREVIATIONS[ab] for ab in self.AUS_STATES})
+
+		return EntityDictionaries(signature=signature,
+					nes=nes,
+					index={what: gazetteer.index[what] if what in gazetteer.index else 
+									EntryIndex(vocab, (e for l in nes[what] for e in nes[what][l])) for what in nes},
+					vocab=vocab,
+					gazetteer=gazetteer,
+					team_names_only={self.normalize(n) for l in teams for n in teams[l]},
+					dead_bands=json.load(open(os.path.join(self.MUSIC_DIR, 'dead_bands.json'))),
+					award_winners=[self.normalize(a) for a in json.load(open(os.path.join(self.MUSIC_DIR, 'award_winners.json')))],
+					artists_popular=self._normalize_dict(json.load(open(os.path.join(self.MUSIC_DIR, 'top_artists.json')))),
+					aus_gig_artists=self._normalize_dict(json.load(open(os.path.join(self.MUSIC_DIR, 'aus_gig_artists.json')))))
+
+	@property
+	def _NES(self):
+		return self._dicts.nes
+
+	def reload_dictionaries(self, force=False):
+		"""
+		rebuild all dictionaries if any of the files have changed (or force=True) and swap them in;
+		whoever is in the middle of labelling an event keeps using the snapshot they started with
+		"""
+		sig_ = self._dictionary_signature()
+
+		if (not force) and (sig_ == self._dicts.signature):
+			return False
+
+		self._dicts = self._load_dictionaries(sig_)
+
+		print(f'reloaded entity dictionaries from {self.DATA_DIR}')
+
+		return True
+
+	def start_reloader(self, every=60):
+		"""
+		check for updated dictionaries every EVERY seconds in a background thread
+		"""
+		if self._reloader and self._reloader.is_alive():
+			return self
+
+		self._reloader_stop.clear()
+
+		def _watch():
+
+			last_seen = self._dicts.signature
+
+			while not self._reloader_stop.wait(every):
+
+				sig_ = self._dictionary_signature()
+
+				# only reload once the files have stopped changing, otherwise we may catch
+				# a bundle that's half way through an update
+				if (sig_ != self._dicts.signature) and (sig_ == last_seen):
+					try:
+						self._dicts = self._load_dictionaries(sig_)
+						print(f'reloaded entity dictionaries from {self.DATA_DIR}')
+					except Exception as e:
+						print(f'failed to reload entity dictionaries: {e}')
+
+				last_seen = sig_
+
+		self._reloader = threading.Thread(target=_watch, name='dictionary-reloader', daemon=True)
+		self._reloader.start()
+
+		return self
+
+	def stop_reloader(self):
+
+		self._reloader_stop.set()
+
+		if self._reloader:
+			self._reloader.join()
+			self._reloader = None
+
+		return self
+
+	@staticmethod
+	def _by_first_letter(dict_):
+		"""
+		return {first letter: {entry: whatever it was mapped to}} for a dictionary dict_ that isn't split by letter
+		"""
+		ldict_ = defaultdict(dict)
+
+		for e, v in dict_.items():
+			ldict_[e[0]][e] = v
+
+		return dict(ldict_)
+
+	def _normalize_dict(self, dict_):
+		"""
+		return a dictionary indexed by first letter with all entries normalized
+		"""
+		ndict_ = defaultdict(list)
+
+		for _ in {self.normalize(f) for l in dict_ for f in dict_[l]}:
+			ndict_[_[0]].append(_)
+
+		return ndict_
+
+	def find_matches(self, st, items):
+		"""
+		generic matcher: find items in string st
+		"""
+
+		found = set()
+
+		for c in items:
+
+			if ' ' + c + ' ' in ' ' + st.lower() + ' ':
+				found.add(c)
+
+		return found
+
+	def get_event_time(self, st):
+		"""
+		find a time stamp in string st and see if it's morning, afternoon or evening
+		"""
+		# we expect to have time stamps like '2013-05-05 12:30:45'
+
+		weekdays = {i: d for i, d in zip([i for i in range(7)], 
+							['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday'])}
+
+		import arrow
+
+		ts = arrow.get(st, 'YYYY-MM-DD HH:mm:ss')
+		hour = ts.hour
+
+		return (weekdays[ts.weekday()], 'morning' if (5 <= hour <= 11) else 
+					'afternoon' if (12 <= hour < 18) else 
+						'evening' if (18 <= hour < 21) else 'night')
+
+	def find(self, st, what, dicts=None):
+		"""
+		find something that is available in an alphabetical dictionary in the string
+		"""
+		d_ = dicts or self._dicts
+
+		assert what in d_.nes, f'unfortunately, {what} is not supported'
+
+		_s = self.normalize(st)
+
+		if not _s:
+			return None
+
+		return self.find_ids(d_.vocab.encode(_s), what, d_)
+
+	def find_ids(self, ids, what, dicts=None):
+		"""
+		same as find but for a description that's already been normalized and encoded as token ids;
+		ids must come from the vocabulary of the same dictionary snapshot
+		"""
+		found = (dicts or self._dicts).index[what].match(ids)
+
+		return found if found else None
+
+	def rank_artists(self, artist_list, dicts=None):
+		"""
+		which artist candidates on the list artist_list are more likely to be artist?
+		"""
+		d_ = dicts or self._dicts
+
+		MAX_ART = 3   # return up to 3 top ranked artists
+
+		bonuses = {'words_in_name': 0.5,    # per extra word
+						'uncommon_words_in_name': 1,   # multiplier
+							'popularity': 2,
+								'award_winner': 1,
+									'performed_in_australia': 0.5,
+										'possibly_dead': -1}   
+
+
+		criteria = {'words_in_name': lambda x: bonuses['words_in_name']*(len(x.split()) - 1),
+					'uncommon_words_in_name': lambda x: bonuses['uncommon_words_in_name']*(1 - sum([(self.spell_checker.check(x) or self.spell_checker.check(x.title())) 
+															for w in x.split()])/len(x.split())),
+					'popularity': lambda x: bonuses['popularity'] if x in d_.artists_popular.get(x[0], []) else 0,
+					'award_winner': lambda x: bonuses['award_winner'] if x in d_.award_winners else 0,
+					'performed_in_australia': lambda x: bonuses['performed_in_australia'] if x in d_.aus_gig_artists.get(x[0], []) else 0,
+					'possibly_dead': lambda x: bonuses['possibly_dead'] if x in d_.dead_bands[x[0]] else 0}
+
+		scores_ = [a._replace(score=sum([a.words_in_name, a.uncommon_words_in_name, a.popularity, a.performed_in_australia,
+							a.possibly_dead]))
+						 for a in [Artist(name=a, **{c: criteria[c](a) for c in criteria}) for a in artist_list]]
+
+		return [_.name for _ in sorted(scores_, key=lambda x: x.score, reverse=True) if _.score > 0][:MAX_ART]
+
+	def rank_countries(self, countries):
+		"""
+		decide what countries in countries are worth keeping
+		"""
+
+		if not isinstance(countries, list):
+			_ = list(countries)
+		else:
+			_ = countries
+
+		list_out = [c for c in _ if (len(c) > 3) or (c in ['aus', 'nz', 'png', 'usa', 'us', 'uk'])]
+
+		return list_out if list_out else None
+
+	def find_teams(self, cands, s, m=None):
+		"""
+		find what teams are mentioned in event description s; only up to 2 teams can be returned!
+		if need more, lift restrictions;
+
+		note: RECURSION!
+		"""
+
+		import jellyfish
+
+		max_words_in_team = len(max(cands, key=lambda _: len(_.split())).split())
+		words_in_string = len(s.split()) 
+
+		# set to store matched teams
+		if not m:
+			m = set()
+
+		if (len(m) > 1) or (not max_words_in_team) or (not words_in_string) or (max_words_in_team > words_in_string):
+			return m
+
+		possible_matches = {' '.join(p) for p in ngrams(s.split(), max_words_in_team)}
+
+		cands_to_remove = set()
+		pms_to_remove = set()
+		
+		# vary levenshtein distance from 0 (exact match) to 2 
+		for lev in range(3):
+
+			for team in cands:
+
+				if not lev:
+
+					if team in possible_matches:
+						m.add(team)
+						
+						if len(m) > 1:
+							return m
+						
+						cands_to_remove.add(team)
+						pms_to_remove.add(team)
+						
+						# remove matched team from description
+						s = ' '.join(s.replace(team, ' ').split())
+				else:
+
+					for pm in possible_matches:
+
+						if jellyfish.levenshtein_distance(team,pm) == lev:
+							m.add(team)
+							
+							if len(m) > 1:
+								return m
+
+							cands_to_remove.add(team)
+							pms_to_remove.add(pm)
+
+			# remove detected candidates from list of candidates
+			# and do same for possible matches
+			cands = cands - cands_to_remove
+			possible_matches = possible_matches - pms_to_remove
+
+		# cover the case when some teams have long names and hence are often mentioned by a shortened name
+		if max_words_in_team > 1: 
+																
+			new_cands = set()
+																
+			for c in cands:
+
+				if len(c.split()) == max_words_in_team:
+
+					if max_words_in_team == 2:
+
+						for v in c.split():
+							if not self.spell_checker.check(v):
+								new_cands.add(v)
+					else:
+
+						for cm in itertools.combinations(c.split(), max_words_in_team - 1):
+							new_cands.add(' '.join(cm))
+						if max_words_in_team > 2:
+							new_cands.add(''.join([x[0] for x in c.split()]))
+			
+			cands = {c for c in cands if not len(c.split()) == max_words_in_team} | new_cands
+
+			m.update(self.find_teams(cands, s, m))
+		
+		return m if m else None
+
+
+	def get_labels(self, s, dicts=None, normalized=None):
+		"""
+		extract all labels from description s; pass normalized if s has already been normalized, either as 
+		a string or as {column: normalized text} to look for every entity type only where FIELD_ROUTES says
+		"""
+		# stick to one dictionary snapshot even if a reload happens half way through
+		d_ = dicts or self._dicts
+
+		return self._match_parts(self._parts(self.normalize(s) if normalized is None else normalized, d_), d_)
+
+	def _parts(self, norm_, d_, types=None):
+		"""
+		return a list of (encoded text, entity types to look for in it) for a normalized description: one part
+		for a string or one per routed column for {column: text}; types limits what to look for
+		"""
+		if isinstance(norm_, dict):
+			parts_ = [(d_.vocab.encode(t), self._routes[c]) for c, t in norm_.items() if t and (c in self._routes)]
+		else:
+			parts_ = [(d_.vocab.encode(norm_), self._all_types)]
+
+		if types is not None:
+			parts_ = [(ids_, types_ & types) for ids_, types_ in parts_]
+
+		return [(ids_, types_) for ids_, types_ in parts_ if types_]
+
+	def _match_parts(self, parts, d_):
+		"""
+		return labels for parts as returned by _parts
+		"""
+		found_ = {}
+
+		geo_ = {k: set() for k in d_.gazetteer.index}
+
+		for ids_, types_ in parts:
+
+			# suburbs, music venues and states all come from a single gazetteer pass
+			if ('suburbs' in types_) or ('music_venues' in types_):
+				for k, v in d_.gazetteer.lookup(ids_).items():
+					if (k in types_) or (k == 'states'):
+						geo_[k] |= v
+
+			for what in types_:
+				if what not in geo_:
+					fnd_ = self.find_ids(ids_, what, d_)
+					if fnd_:
+						found_[what] = (found_[what] | fnd_) if what in found_ else fnd_
+
+		labels_ = dict()
+
+		for what in d_.nes:
+
+			fnd_ = geo_[what] if what in geo_ else found_.get(what)
+
+			if fnd_:
+
+				if what == 'artists':
+					fnd_ = self.rank_artists(fnd_, d_)
+				elif what == 'countries':
+					fnd_ = self.rank_countries(fnd_)
+
+				if fnd_:
+					labels_.update({what: fnd_})
+
+		labels_.update(self._locations(geo_, d_))
+
+		return labels_
+
+	def _locations(self, geo_, d_):
+		"""
+		return location labels for what the gazetteer found
+		"""
+		labels_ = dict()
+
+		if geo_['suburbs'] or geo_['music_venues']:
+
+			locations_, venue_locations_ = d_.gazetteer.resolve(geo_['suburbs'], geo_['music_venues'], geo_['states'])
+
+			if locations_:
+				labels_['locations'] = locations_
+			if venue_locations_:
+				labels_['venue_locations'] = venue_locations_
+
+		return labels_
+
+	def label_event(self, pk_, ds_, norm_=None, dicts=None):
+		"""
+		label a single event with primary key pk_ and description ds_; normalized version is norm_ if available, 
+		either a string or {column: normalized text} (see get_labels). Uses dictionary snapshot dicts if given
+		"""
+		d_ = dicts or self._dicts
+
+		e = SlimEvent(event_id=pk_, description=ds_)
+
+		e._labels = self.get_labels(e.description, d_, norm_)
+
+		return self._finish_labels(e, d_)
+
+	def _finish_labels(self, e, d_, teams=None):
+		"""
+		decide event type and look harder for teams if it's at a sport venue; teams found like that
+		for a near-duplicate event can be passed as teams
+		"""
+		e.get_type()
+
+		if e._labels.get('sport_venues', None) and (len(e._labels.get('teams', [])) < 2):
+			e._labels['teams'] = teams if teams is not None else self.find_teams(d_.team_names_only, e.description)
+
+		return e
+
+	def label_near_duplicate(self, labels, teams, pk_, ds_, norm_, dicts=None):
+		"""
+		label an event that is a near-duplicate of an already labelled one with labels labels (as returned by 
+		get_labels) and teams found at a sport venue teams (or None): take these labels and only look again
+		for the things that usually differ between sessions of the same show, i.e. where it's on
+		"""
+		d_ = dicts or self._dicts
+
+		e = SlimEvent(event_id=pk_, description=ds_)
+
+		e._labels = {k: v for k, v in labels.items() if k not in self.CLUSTER_FIELDS + ('locations', 'venue_locations')}
+
+		e._labels.update(self._match_parts(self._parts(norm_, d_, frozenset(self.CLUSTER_FIELDS)), d_))
+
+		return self._finish_labels(e, d_, teams)
+
+	def label_clustered(self, rows, keys=None):
+		"""
+		label rows of (primary key, description, normalized description) by grouping near-duplicate descriptions 
+		and fully labelling only one event per group (and the ones in it that don't describe quite the same show); 
+		returns events in the same order as rows. Groups are formed by comparing keys if given (e.g. descriptions 
+		without dates and venues) or normalized descriptions
+		"""
+		if self._lsh is None:
+			from dedup import MinHashLSH
+			self._lsh = MinHashLSH()
+
+		events_ = [None]*len(rows)
+
+		for cluster in self._lsh.clusters(keys if keys is not None else [self._joined(norm_) for _, _, norm_ in rows]):
+
+			d_ = self._dicts
+
+			pk_, ds_, norm_ = rows[cluster[0]]
+			show_ = self._show_text(norm_)
+
+			rep_ = events_[cluster[0]] = SlimEvent(event_id=pk_, description=ds_)
+			labels_ = self.get_labels(rep_.description, d_, norm_)
+			rep_._labels = dict(labels_)
+
+			self._finish_labels(rep_, d_)
+
+			# if the representative needed the slow team search, its result goes to the whole group
+			teams_ = rep_._labels.get('teams') if (labels_.get('sport_venues') and (len(labels_.get('teams', [])) < 2)) else None
+
+			# near-duplicates can still differ in what the show is (e.g. extra title columns), those are labelled
+			# in full as taking the representative's labels would give them labels they don't have or miss some
+			for i in cluster[1:]:
+				if self._show_text(rows[i][2]) == show_:
+					events_[i] = self.label_near_duplicate(labels_, teams_, *rows[i], d_)
+				else:
+					events_[i] = self.label_event(*rows[i], d_)
+
+		return events_
+
+	def _show_text(self, norm_):
+		"""
+		return the part of a normalized description that label_near_duplicate takes labels from: the columns
+		where anything but CLUSTER_FIELDS is looked for or the whole description if it's not by column
+		"""
+		if not isinstance(norm_, dict):
+			return norm_
+
+		return {c: t for c, t in norm_.items() if not (self._routes.get(c, frozenset()) <= set(self.CLUSTER_FIELDS))}
+
+	@staticmethod
+	def _joined(norm_):
+		"""
+		return a normalized description as a single string whether it comes as such or by column
+		"""
+		return ' '.join([t for t in norm_.values() if t]) if isinstance(norm_, dict) else norm_
+
+	def _descriptions(self, events, columns=None, id_column='pk_event_dim'):
+		"""
+		go through a data frame with events and yield ids, descriptions and normalized descriptions; 
+		descriptions are made of columns or, by default, all columns but the first (the primary key).
+		If any of these columns are in FIELD_ROUTES, normalized descriptions are {column: normalized text}
+		for the routed columns and the rest are only used to decide event types
+		"""
+		import pandas as pd
+
+		descr_cols = list(columns) if columns is not None else list(events.columns[1:])
+
+		pks_ = events[id_column].tolist() if id_column is not None else events.index.tolist()
+		# missing values are None when read from the database but NaN when read from a snapshot, skip both
+		descr_ = [' '.join([str(v) for v in row if not pd.isna(v)]).strip() for row in zip(*[events[c] for c in descr_cols])]
+
+		routed_ = [c for c in descr_cols if c in self._routes]
+
+		# normalize all descriptions (or columns) in one go rather than once per event
+		if routed_:
+			by_col_ = [self.normalize_series(pd.Series([str(v) if not pd.isna(v) else '' for v in events[c]], dtype=object)).tolist() 
+							for c in routed_]
+			norm_ = [dict(zip(routed_, row)) for row in zip(*by_col_)]
+		else:
+			norm_ = self.normalize_series(pd.Series(descr_, dtype=object)).tolist()
+
+		yield from zip(pks_, descr_, norm_)
+
+	def label_batch(self, descriptions, batch_size=1000, dedup=False):
+		"""
+		label an iterable of descriptions (or (event id, description) pairs) without touching the database or 
+		the file system; reads and labels batch_size descriptions at a time and yields a to_json() dict per 
+		description, in the same order. Descriptions without ids get their position as id
+		"""
+		import pandas as pd
+
+		it_ = iter(descriptions)
+		n_ = 0
+
+		while True:
+
+			batch_ = list(itertools.islice(it_, batch_size))
+
+			if not batch_:
+				break
+
+			ids_, descr_ = zip(*[d if isinstance(d, tuple) else (n_ + i, d) for i, d in enumerate(batch_)])
+			n_ += len(batch_)
+
+			descr_ = [d if isinstance(d, str) else '' for d in descr_]
+			norm_ = self.normalize_series(pd.Series(descr_, dtype=object)).tolist()
+
+			yield from (e.to_json() for e in self._label_rows(list(zip(ids_, descr_, norm_)), dedup))
+
+	def label_frame(self, df, columns, id_column=None, dedup=False):
+		"""
+		label every row of data frame df using the text in columns; returns a list of to_json() dicts
+		in row order, with the values in id_column (or the index) as event ids
+		"""
+		return [e.to_json() for e in self._label_rows(list(self._descriptions(df, columns, id_column)), dedup)]
+
+	def _label_rows(self, rows, dedup=False):
+		"""
+		label rows of (event id, description, normalized description); descriptions too short to mean anything
+		get no labels
+		"""
+		ok_ = [len(ds_) > 2 for _, ds_, _ in rows]
+
+		if dedup:
+			labelled_ = iter(self.label_clustered([r for r, o in zip(rows, ok_) if o]))
+		else:
+			labelled_ = (self.label_event(*r) for r, o in zip(rows, ok_) if o)
+
+		return [next(labelled_) if o else SlimEvent(event_id=r[0], description=r[1]) for r, o in zip(rows, ok_)]
@@ -0,0 +1,113 @@
+import os
+import json
+from collections import defaultdict
+
+class DescriptionIndex:
+
+	"""
+	descriptions of the events we've labelled along with an inverted index from normalized tokens to event ids;
+	descriptions are kept in an append-only json lines file, the token index is rebuilt when the file is loaded
+	"""
+	def __init__(self, file_):
+
+		self.file_ = file_
+		self.descriptions = {}
+		self.postings = defaultdict(set)
+
+		if os.path.exists(file_):
+			with open(file_) as f:
+				for l in f:
+					ev_id, descr, norm = json.loads(l)
+					self._add(str(ev_id), descr, norm)
+
+	def __len__(self):
+		return len(self.descriptions)
+
+	def _add(self, ev_id, descr, norm):
+
+		if ev_id in self.descriptions:
+			for t in _tokens(self.descriptions[ev_id][1]):
+				self.postings[t].discard(ev_id)
+
+		self.descriptions[ev_id] = (descr, norm)
+
+		for t in _tokens(norm):
+			self.postings[t].add(ev_id)
+
+	def candidates(self, entry):
+		"""
+		return ids of the events whose descriptions contain every token in entry
+		"""
+		toks_ = entry.split()
+
+		if not toks_:
+			return set()
+
+		ids_ = set(self.postings.get(toks_[0], ()))
+
+		for t in toks_[1:]:
+			if not ids_:
+				break
+			ids_ &= self.postings.get(t, set())
+
+		return ids_
+
+
+def _tokens(norm):
+	"""
+	return the set of tokens in a normalized description that is a string or {column: normalized text}
+	"""
+	return {t for v in norm.values() for t in v.split()} if isinstance(norm, dict) else set(norm.split())
+
+def append_descriptions(file_, records):
+	"""
+	append records (event id, description, normalized description) to the description file without loading it
+	"""
+	with open(file_, 'a') as f:
+		for ev_id, descr, norm in records:
+			f.write(json.dumps([str(ev_id), descr, norm]) + '\n')
+
+# entries with details look like name|detail|detail, see dictionary_entries
+ENTRY_SEP = '|'
+
+def entry_name(entry):
+	"""
+	return the name an entry from dictionary_entries is found by in descriptions
+	"""
+	return entry.split(ENTRY_SEP)[0]
+
+def dictionary_entries(dicts):
+	"""
+	return {entity type: set of entries} for a dictionary snapshot; the lists used to rank artists are
+	included under their own names as changing them may change which artists make it. Where suburbs and 
+	music venues are (states and postcodes) goes into location labels, so suburbs and venues are also 
+	included with their locations as suburb|state|postcodes and venue|suburb|state
+	"""
+	entries_ = {what: {e for l in dicts.nes[what] for e in dicts.nes[what][l]} for what in dicts.nes}
+
+	entries_['award_winners'] = set(dicts.award_winners)
+
+	for k in ['artists_popular', 'aus_gig_artists', 'dead_bands']:
+		entries_[k] = {e for l in getattr(dicts, k) for e in getattr(dicts, k)[l]}
+
+	entries_['suburb_locations'] = {ENTRY_SEP.join([sub, st, '/'.join(pcs)]) 
+										for sub, recs in dicts.gazetteer.suburbs.items() for st, pcs in recs}
+
+	entries_['venue_locations'] = {ENTRY_SEP.join([v, sub, st]) for v, (sub, st) in dicts.gazetteer.venues.items()}
+
+	return entries_
+
+def diff_entries(old, new):
+	"""
+	compare two {entity type: entries} dictionaries; return {entity type: (added, removed)} for the types that changed
+	"""
+	diff_ = {}
+
+	for what in set(old) | set(new):
+
+		o_, n_ = set(old.get(what, ())), set(new.get(what, ()))
+
+		if o_ != n_:
+			diff_[what] = (n_ - o_, o_ - n_)
+
+	return diff_
@@ -0,0 +1,145 @@
+"""
+pin down what performance work must not change: the normalisers give what the original one-substitution-at-a-time
+code gave, for a single string and for a whole series; the token id entry index finds what the original
+letter-bucket find found; posting lists come back from their compressed form unchanged
+
+run from the evententities directory:
+
+	python -m pytest -q tests
+"""
+
+import os
+import re
+import sys
+import random
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from artistnormaliser import BaseNormaliser, ArtistNameNormaliser
+from vocabulary import Vocabulary, EntryIndex
+from entityindex import _encode, _decode
+
+
+def _baseline_normalize(s):
+	"""
+	the normaliser as it was before the combined regexes: one re.sub per abbreviation and per spelled out number
+	"""
+	s = s.lower()
+
+	for ab in BaseNormaliser.ABBREVIATIONS:
+		s = re.sub(r'\b' + ab + r'\b', BaseNormaliser.ABBREVIATIONS[ab], s)
+
+	s = re.sub(r'[\[\]\{\}\(\)]','', re.sub(r'[_\-:;/.,\"\`\']', ' ', s.lower()))
+
+	for w_ in BaseNormaliser.SPELLED_NUMBERS:
+		s = re.sub(r'\b' + w_ + r'\b', BaseNormaliser.SPELLED_NUMBERS[w_], s)
+
+	return re.sub(r'\s{2,}', ' ', s.replace(' and ',' & ')).strip()
+
+def _baseline_artist_normalize(name):
+
+	name = _baseline_normalize(re.sub(r'\s*:[\(\)]\s*',' @artist ', name))
+
+	if name.strip() in {'?','...'}:
+		return '@artist'
+
+	name = re.sub(r'\!+$','', re.sub(r'\!+(?=[^\b\w])','', name)).replace('!','i')
+	name = re.sub(r'^(the|a)\s+','', name)
+
+	return re.sub(r'\s{2,}', ' ', name).strip()
+
+def _adversarial_strings(n, seed=7):
+	"""
+	strings made of abbreviations, spelled out numbers, separators, brackets, emoticons and exclamation marks
+	glued together in every which way
+	"""
+	rnd = random.Random(seed)
+
+	pieces_ = list(BaseNormaliser.ABBREVIATIONS) + list(BaseNormaliser.SPELLED_NUMBERS) + \
+				['and', 'the', 'a', 'rolling', 'stones', 'sydney', 'fc', 'live!', 'p!nk', 'ke$ha', '?', '...', ':)', ':(',
+				 '(', ')', '[', ']', '{', '}', '-', '_', ':', ';', '/', '.', ',', '"', '`', "'", '!', '!!', '  ', '\t']
+
+	strings_ = []
+
+	for _ in range(n):
+		s_ = ''.join(rnd.choice(pieces_) + rnd.choice(['', ' ', '  ', '-', '.']) for _ in range(rnd.randint(0, 12)))
+		strings_.append(s_.upper() if rnd.random() < 0.3 else s_)
+
+	return strings_ + ['', ' ', '?', '...', ' ? ', 'the the', 'a and a', 'twenty two', 'twentytwo', 'gwsg v gws']
+
+
+STRINGS = _adversarial_strings(3000)
+
+
+def test_normalize_matches_baseline():
+
+	bn, an = BaseNormaliser(), ArtistNameNormaliser()
+
+	assert [bn.normalize(s) for s in STRINGS] == [_baseline_normalize(s) for s in STRINGS]
+	assert [an.normalize(s) for s in STRINGS] == [_baseline_artist_normalize(s) for s in STRINGS]
+
+def test_normalize_series_matches_scalar():
+
+	pd = pytest.importorskip('pandas')
+
+	ser_ = pd.Series(STRINGS, dtype=object)
+
+	assert BaseNormaliser().normalize_series(ser_).tolist() == [_baseline_normalize(s) for s in STRINGS]
+	assert ArtistNameNormaliser().normalize_series(ser_).tolist() == [_baseline_artist_normalize(s) for s in STRINGS]
+
+
+def _letter_bucket_find(st, dk):
+	"""
+	the dictionary lookup as it was before token ids: candidates bucketed by first letter, then a substring check
+	"""
+	words = st.split()
+	found = set()
+
+	for i, w in enumerate(words):
+		if w[0].isalpha() and (w[0] in dk):
+			found.update(c for c in dk[w[0]] if (len(c.split()) <= len(words[i:])) and (' ' + c + ' ' in ' ' + st + ' '))
+
+	return found
+
+def test_entry_index_matches_letter_buckets():
+
+	rnd = random.Random(11)
+
+	words_ = ['royal', 'arena', 'rod', 'laver', 'park', 'the', 'hotel', 'hope', 'star', 'stars', 'theatre', 'a',
+				'42nd', 'street', 'new', 'york', 'york park', 'st', 'kilda', 'club']
+
+	entries_ = {' '.join(rnd.sample(words_, rnd.randint(1, 3))) for _ in range(300)} | \
+				{'1300smiles stadium', 'double  spaced', 'a', 'the hotel', 'hotel'}
+
+	dk = {}
+	for e in entries_:
+		dk.setdefault(e[0], []).append(e)
+
+	vocab = Vocabulary()
+	index_ = EntryIndex(vocab, (e for l in dk for e in dk[l]))
+
+	for _ in range(2000):
+		st = ' '.join(rnd.choice(words_ + ['unknown', 'words']) for _ in range(rnd.randint(1, 10)))
+		assert index_.match(vocab.encode(st)) == _letter_bucket_find(st, dk), st
+
+def test_entry_index_takes_names_not_details():
+
+	# dictionaries with details like sponsors.json ({sponsor: sports}) are indexed by name once split by letter
+	from labeller import EventLabeller
+
+	sponsors_ = EventLabeller._by_first_letter({'swatch': ['volleyball'], 'subaru': ['cycling']})
+
+	vocab = Vocabulary()
+	index_ = EntryIndex(vocab, (e for l in sponsors_ for e in sponsors_[l]))
+
+	assert index_.match(vocab.encode('swatch beach volleyball')) == {'swatch'}
+	assert not index_.match(vocab.encode('cycling'))
+
+
+@pytest.mark.parametrize('ids', [[], [0], [1], [5, 6, 7], [127, 128, 16383, 16384, 2**21, 2**35 + 3],
+									sorted(random.Random(3).sample(range(10**9), 5000))])
+def test_postings_round_trip(ids):
+
+	assert _decode(_encode(ids)) == ids
@@ -0,0 +1,136 @@
+"""
+build a local SQLite stand-in for the event table with the same columns as DWSales.dbo.event_dim filled with
+synthetic events made of artists, teams, venues and suburbs from the dictionaries
+
+usage (from the evententities directory so that ./data can be found):
+
+	python utils/make_event_dim.py event_dim.db [--rows 2000000] [--seed 42]
+
+then connect with EventFeatureFactory().start_session(url='sqlite:///event_dim.db') and set EVENT_TBL to 'event_dim'
+"""
+
+import os
+import json
+import time
+import random
+import sqlite3
+import argparse
+from datetime import datetime, timedelta
+
+COLUMNS = ('pk_event_dim', 'primary_show_desc', 'performance_time', 'title_who', 'title_where', 'title_when',
+				'title1', 'title2', 'title3', 'title4', 'title5', 'title6')
+
+EXTRAS = ('with special guests', 'all ages', 'licensed event', 'doors open 7pm', 'seated', 'general admission',
+				'vip package', 'world tour', 'australian tour', 'final show', 'matinee', 'early show')
+
+
+def _entries(file_):
+	"""
+	return all entries in a {letter: entries} dictionary file
+	"""
+	d_ = json.load(open(file_))
+
+	return sorted({e for l in d_ for e in d_[l]})
+
+def _shows(data_dir, rnd, n):
+	"""
+	make n shows as (primary show description, who, kind); every show later gets many sessions
+	"""
+	artists = _entries(os.path.join(data_dir, 'music', 'top_artists.json'))
+	teams = _entries(os.path.join(data_dir, 'sports', 'teams.json'))
+	comedians = _entries(os.path.join(data_dir, 'comedy', 'comedians.json'))
+	musicals = _entries(os.path.join(data_dir, 'musical', 'musicals.json'))
+
+	shows_ = []
+
+	for _ in range(n):
+
+		p_ = rnd.random()
+
+		if p_ < 0.6:
+			who_ = rnd.choice(artists)
+			shows_.append((f'{who_} {rnd.choice(["live", "in concert", "world tour", "australian tour", ""])}'.strip().upper(), who_, 'music'))
+		elif p_ < 0.8:
+			a_, b_ = rnd.sample(teams, 2)
+			shows_.append((f'{a_} v {b_}'.upper(), f'{a_} v {b_}', 'sport'))
+		elif p_ < 0.9:
+			who_ = rnd.choice(comedians)
+			shows_.append((f'{who_} {rnd.choice(["live", "stand up", "new show"])}'.upper(), who_, 'comedy'))
+		else:
+			who_ = rnd.choice(musicals)
+			shows_.append((f'{who_} the musical'.upper(), '', 'musical'))
+
+	return shows_
+
+def _venues(data_dir):
+	"""
+	return (music venues with their suburbs, sport venues, suburbs)
+	"""
+	locations_ = json.load(open(os.path.join(data_dir, 'music', 'music-venues.json')))
+
+	music_ = sorted({(v['name'], v['location'].split(',')[0].strip()) for l in locations_ for v in locations_[l]})
+
+	return music_, _entries(os.path.join(data_dir, 'sports', 'sport-venues.json')), _entries(os.path.join(data_dir, 'geo', 'suburbs.json'))
+
+def rows(n, data_dir='data', seed=42, start=1):
+	"""
+	yield n synthetic event table rows (tuples in the order of COLUMNS) with primary keys from start
+	"""
+	rnd = random.Random(seed)
+
+	shows_ = _shows(data_dir, rnd, max(n//20, 1))
+	music_, sport_, suburbs_ = _venues(data_dir)
+
+	t0 = datetime(2012, 1, 1)
+
+	for pk in range(start, start + n):
+
+		descr_, who_, kind_ = rnd.choice(shows_)
+
+		if kind_ == 'sport':
+			where_ = f'{rnd.choice(sport_)}, {rnd.choice(suburbs_)}'
+		else:
+			where_ = ', '.join(rnd.choice(music_))
+
+		ts_ = t0 + timedelta(days=rnd.randrange(2500), minutes=rnd.randrange(10, 23*60, 15))
+
+		extras_ = [rnd.choice(EXTRAS) if rnd.random() < 0.5/(i + 1) else None for i in range(6)]
+
+		yield (pk, descr_, ts_.strftime('%Y-%m-%d %H:%M:%S'), who_.upper() or None, where_.upper(),
+				ts_.strftime('%a %d %b %Y %I:%M%p'), *extras_)
+
+def make_event_dim(file_, n, data_dir='data', seed=42, batch_size=100000):
+	"""
+	create table event_dim in SQLite database file_ (replacing it if it's there) and fill it with n rows
+	"""
+	conn = sqlite3.connect(file_)
+
+	conn.execute('DROP TABLE IF EXISTS event_dim;')
+	conn.execute(f"""CREATE TABLE event_dim (pk_event_dim INTEGER PRIMARY KEY,
+						{', '.join(f'{c} TEXT' for c in COLUMNS[1:])});""")
+
+	it_ = rows(n, data_dir, seed)
+	insert_ = f'INSERT INTO event_dim VALUES ({", ".join("?"*len(COLUMNS))});'
+
+	with conn:
+		for i in range(0, n, batch_size):
+			conn.executemany(insert_, (next(it_) for _ in range(min(batch_size, n - i))))
+
+	conn.close()
+
+
+if __name__ == '__main__':
+
+	parser = argparse.ArgumentParser(description='make a synthetic SQLite event table')
+	parser.add_argument('file', help='SQLite database file to create')
+	parser.add_argument('--rows', type=int, default=2000000)
+	parser.add_argument('--data-dir', default=os.path.join(os.path.curdir, 'data'))
+	parser.add_argument('--seed', type=int, default=42)
+
+	args = parser.parse_args()
+
+	t_ = time.perf_counter()
+
+	make_event_dim(args.file, args.rows, args.data_dir, args.seed)
+
+	print(f'made {args.rows:,} rows in {args.file} in {time.perf_counter() - t_:.1f} sec')
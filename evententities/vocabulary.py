@@ -0,0 +1,95 @@
+from array import array
+from collections import defaultdict
+
+class Vocabulary:
+
+	"""
+	intern normalized tokens as integer ids so that dictionary entries and descriptions
+	can be compared as int sequences rather than strings
+	"""
+	# id 0 is reserved for tokens that aren't in the vocabulary
+	UNKNOWN = 0
+
+	def __init__(self):
+
+		self._ids = {}
+		self._tokens = ['']
+
+	def __len__(self):
+		return len(self._tokens) - 1
+
+	def __contains__(self, token):
+		return token in self._ids
+
+	def intern(self, token):
+		"""
+		return id of token, adding it to the vocabulary if it's new
+		"""
+		id_ = self._ids.get(token)
+
+		if id_ is None:
+			id_ = self._ids[token] = len(self._tokens)
+			self._tokens.append(token)
+
+		return id_
+
+	def add(self, s):
+		"""
+		intern all tokens in (already normalized) string s and return their ids
+		"""
+		return array('I', [self.intern(t) for t in s.split()])
+
+	def encode(self, s):
+		"""
+		return ids of the tokens in (already normalized) string s; tokens we haven't seen get UNKNOWN
+		"""
+		get = self._ids.get
+
+		return array('I', [get(t, 0) for t in s.split()])
+
+	def decode(self, ids):
+
+		return ' '.join([self._tokens[i] for i in ids])
+
+
+class EntryIndex:
+
+	"""
+	dictionary entries stored as int sequences and bucketed by the id of their first token
+	"""
+	def __init__(self, vocab, entries):
+
+		self._index = defaultdict(list)
+
+		for e in entries:
+			# descriptions are normalized, so entries that aren't single-spaced or don't start with
+			# a letter could never have matched anyway
+			if e and e[0].isalpha() and (e == ' '.join(e.split())):
+				ids = vocab.add(e)
+				self._index[ids[0]].append((ids, e))
+
+	def __len__(self):
+		return sum(len(b) for b in self._index.values())
+
+	def match(self, ids):
+		"""
+		return all entries found in the encoded description ids
+		"""
+		found = set()
+		bucket = self._index.get
+
+		for i, t in enumerate(ids):
+
+			for e_ids, e in bucket(t, ()):
+
+				if ids[i:i + len(e_ids)] == e_ids:
+					found.add(e)
+
+		return found
+
+
+def ngrams(seq, n):
+	"""
+	return all n-grams in sequence seq (a list of tokens or an array of token ids) as tuples
+	"""
+	return zip(*[seq[i:] for i in range(n)])